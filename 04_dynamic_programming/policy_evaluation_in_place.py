@@ -2,12 +2,15 @@ import numpy as np
 import sys
 if "../" not in sys.path:
     sys.path.append("../")
+from lib.envs.cliff_walking import CliffWalkingEnv
 from lib.envs.gridworld import GridworldEnv
+from lib.envs.windy_gridworld import WindyGridworldEnv
+from lib.mdp import compile_model, solve_policy_values
 
 env = GridworldEnv()
 
 
-def policy_eval(policy, env, discount_factor=1.0, theta=0.00001):
+def policy_eval(policy, env, discount_factor=1.0, theta=0.00001, method='iterative', V0=None):
     """
     Evaluate a policy given an environment and environment's dynamics.
 
@@ -17,12 +20,43 @@ def policy_eval(policy, env, discount_factor=1.0, theta=0.00001):
             env.P[s][a] is a list of transition tuples (prob, next_state, reward, done).
             env.nS is a number of states in the environment.
             env.nA is a number of actions in the environment.
-            discount_factor: float, Gamma discount factor (default: 1.0, i.e. undiscounted)
+            A compiled lib.mdp.TabularModel is accepted as well.
+        discount_factor: float, Gamma discount factor (default: 1.0, i.e. undiscounted)
         theta: float, we stop evaluation once our value function change is less than theta for all states.
+        method: str, 'iterative' (default) sweeps until convergence. 'direct', 'gmres', 'bicgstab'
+            and 'auto' solve the linear Bellman equation instead, see lib.mdp.solve_policy_values.
+        V0: ndarray, optional initial value function, e.g. the one of the previous policy.
 
     Returns: ndarray, vector of length env.nS representing the value function.
     """
-    # Start with a random (all 0) value function
+    model = compile_model(env)
+    if method != 'iterative':
+        return solve_policy_values(model, policy, discount_factor, method=method, V0=V0, theta=theta)
+
+    P_pi, r_pi = model.policy_model(policy)
+    # CSR rows of the policy transition matrix: successors of s are indices[indptr[s]:indptr[s + 1]]
+    indptr, indices, probs = P_pi.indptr, P_pi.indices, P_pi.data
+
+    # Start with a random (all 0) value function, unless given a warm start
+    V = np.zeros(model.nS) if V0 is None else np.array(V0, dtype=np.float64)
+    while True:
+        delta = 0.
+        for s in range(model.nS):
+            lo, hi = indptr[s], indptr[s + 1]
+            # store the next-time-step value for state s
+            v = r_pi[s] + discount_factor * np.dot(probs[lo:hi], V[indices[lo:hi]])
+            delta = max(delta, abs(v - V[s]))
+            V[s] = v  # modify value function in-place
+        if delta < theta:
+            break
+    return V
+
+
+def dict_policy_eval(policy, env, discount_factor=1.0, theta=0.00001):
+    """
+    Reference in-place policy evaluation walking the env.P transition lists, transitions
+    that end the episode do not bootstrap. Slow, used to check the compiled solvers.
+    """
     V = np.zeros(env.nS)
     while True:
         delta = 0.
@@ -30,7 +64,7 @@ def policy_eval(policy, env, discount_factor=1.0, theta=0.00001):
             v = 0.  # store the next-time-step value for state s
             for a in actions.keys():
                 for prob, next_state, reward, done in env.P[s][a]:
-                    v += policy[s, a] * prob * (reward + discount_factor * V[next_state])
+                    v += policy[s, a] * prob * (reward + (not done) * discount_factor * V[next_state])
             delta = max(delta, abs(v - V[s]))
             V[s] = v  # modify value function in-place
         if delta < theta:
@@ -58,4 +92,20 @@ if __name__ == '__main__':
     print('ANSWER: {}'.format(np.round(v, decimals=0)))
     print('SOLUTION: {}'.format(expected_v))
 
-    np.testing.assert_array_almost_equal(v, expected_v, decimal=2)
\ No newline at end of file
+    np.testing.assert_array_almost_equal(v, expected_v, decimal=2)
+
+    #################################
+    ### Episodic tasks ended by done
+    #################################
+    # The goals of CliffWalking and WindyGridworld are only marked by done, every solver
+    # has to agree with the reference on them
+    for episodic_env in (CliffWalkingEnv(), WindyGridworldEnv()):
+        random_policy = np.ones([episodic_env.nS, episodic_env.nA]) / episodic_env.nA
+        expected_v = dict_policy_eval(random_policy, episodic_env, discount_factor=0.9, theta=1e-8)
+        for method in ('iterative', 'direct', 'gmres', 'bicgstab'):
+            v = policy_eval(random_policy, episodic_env, discount_factor=0.9, theta=1e-8, method=method)
+            np.testing.assert_array_almost_equal(v, expected_v, decimal=4)
+        # Undiscounted, the random policy still ends every episode, so the system is non-singular
+        v = policy_eval(random_policy, episodic_env, method='direct')
+        np.testing.assert_array_almost_equal(
+            v, policy_eval(random_policy, episodic_env, method='bicgstab', theta=1e-8), decimal=4)
@@ -5,11 +5,12 @@ if "../" not in sys.path:
     sys.path.append("../")
 
 from lib.envs.gridworld import GridworldEnv
+from lib.mdp import compile_model, solve_policy_values
 
 env = GridworldEnv()
 
 
-def policy_eval(policy, env, discount_factor=1.0, theta=0.00001):
+def policy_eval(policy, env, discount_factor=1.0, theta=0.00001, method='iterative', V0=None):
     """
     Evaluate a policy given an environment and environment's dynamics.
 
@@ -19,26 +20,30 @@ def policy_eval(policy, env, discount_factor=1.0, theta=0.00001):
             env.P[s][a] is a list of transition tuples (prob, next_state, reward, done).
             env.nS is a number of states in the environment.
             env.nA is a number of actions in the environment.
-            discount_factor: float, Gamma discount factor (default: 1.0, i.e. undiscounted)
+            A compiled lib.mdp.TabularModel is accepted as well.
+        discount_factor: float, Gamma discount factor (default: 1.0, i.e. undiscounted)
         theta: float, we stop evaluation once our value function change is less than theta for all states.
+        method: str, 'iterative' (default) sweeps until convergence. 'direct', 'gmres', 'bicgstab'
+            and 'auto' solve the linear Bellman equation instead, see lib.mdp.solve_policy_values.
+        V0: ndarray, optional initial value function, e.g. the one of the previous policy.
 
     Returns: ndarray, vector of length env.nS representing the value function.
     """
+    model = compile_model(env)
+    if method != 'iterative':
+        return solve_policy_values(model, policy, discount_factor, method=method, V0=V0, theta=theta)
 
-    # Start with a random (all 0) value function
-    V = np.zeros(env.nS)
+    # Transition matrix and expected reward of the policy, shared by every sweep
+    P_pi, r_pi = model.policy_model(policy)
+
+    # Start with a random (all 0) value function, unless given a warm start
+    V = np.zeros(model.nS) if V0 is None else np.array(V0, dtype=np.float64)
 
     # Loop indefinitely
     while True:
-        # Initialize (all 0) a second array with the value function for next time step
-        V_next = np.zeros(env.nS)
-        delta = 0.
-        for state, actions in env.P.items():
-            for a in actions.keys():
-                for trans_prob, next_state, reward, done in env.P[state][a]:
-                    V_next[state] += policy[state, a] * trans_prob * (
-                                reward + discount_factor * V[next_state])  # (Eq. 4.5)
-            delta = max(delta, abs(V_next[state] - V[state]))
+        # Compute the value function for next time step in a second array (Eq. 4.5)
+        V_next = r_pi + discount_factor * P_pi.dot(V)
+        delta = np.max(np.abs(V_next - V))
         # Update current value function by next-time-step value function
         V = V_next
         # Stop evaluation once value function change insignificant
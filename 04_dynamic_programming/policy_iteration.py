@@ -5,7 +5,9 @@ import sys
 if "../" not in sys.path:
     sys.path.append("../")
 from lib.envs.gridworld import GridworldEnv
-from DynamicProgramming.policy_evaluation_two_arrays import policy_eval
+from lib.mdp import compile_model
+from lib.utils import randargmax_rows
+from policy_evaluation_two_arrays import policy_eval
 
 pp = pprint.PrettyPrinter(indent=2)
 env = GridworldEnv()
@@ -17,9 +19,12 @@ def policy_improvement(env, policy_eval_fn=policy_eval, discount_factor=1.0):
     until an optimal policy is found.
 
     Args:
-        env: The OpenAI envrionment.
+        env: The OpenAI envrionment, or a compiled lib.mdp.TabularModel.
         policy_eval_fn: Policy Evaluation function that takes 3 arguments:
-            policy, env, discount_factor.
+            policy, env, discount_factor, and the keyword argument V0, the value
+            function of the previous policy to warm-start from (None at first).
+            Use functools.partial(policy_eval, method='auto') to evaluate each policy
+            with a single linear solve instead of iterative sweeps.
         discount_factor: gamma discount factor.
 
     Returns:
@@ -30,45 +35,93 @@ def policy_improvement(env, policy_eval_fn=policy_eval, discount_factor=1.0):
 
     """
 
-    def one_step_lookahead(s, V):
-        '''
-            One step lookahead, Eq. (4.9)
-        '''
-        action_values = np.zeros(env.nA)
-        for a in env.P[s].keys():
-            v = 0
-            for prob, next_state, reward, done in env.P[s][a]:
-                v += prob * (reward + discount_factor * V[next_state])
-            action_values[a] = v
-        return action_values
+    model = compile_model(env)
 
     # Initialization
     # Start with random policy
-    policy = np.ones([env.nS, env.nA]) / env.nA
+    policy = np.ones([model.nS, model.nA]) / model.nA
+    # the random policy has no current action yet
+    chosen_a = None
+    V = None
 
     while True:
 
         #######################
         # Policy evaluation
         #######################
-        V = policy_eval(policy=policy, env=env)
+        # warm-start from the value function of the previous policy
+        V = policy_eval_fn(policy, model, discount_factor, V0=V)
 
         #######################
         # Policy improvement
         #######################
-        policy_stable = True
-        for s in range(env.nS):
-            # choose current action by acting greedily on current policy
-            chosen_a = np.argmax(policy[s])
-            action_values = one_step_lookahead(s, V)
-            # act greedily wrt to current value function
-            best_a = np.argmax(action_values)
-            policy[s] = np.eye(env.nA)[best_a]
-            # if policy does not change anymore, it converged to optimal
-            if best_a != chosen_a:
-                policy_stable = False
+        # act greedily wrt to current value function, one step lookahead Eq. (4.9),
+        # ties broken at random but in favor of the current action
+        best_a = randargmax_rows(model.q_values(V, discount_factor), prefer=chosen_a)
+        policy = np.eye(model.nA)[best_a]
+        # if policy does not change anymore, it converged to optimal
+        policy_stable = np.array_equal(best_a, chosen_a)
         if policy_stable:
             return (policy, V)
+        chosen_a = best_a
+
+
+def modified_policy_iteration(env, k=5, discount_factor=1.0, theta=0.0001, max_sweeps=1000):
+    """
+    Modified Policy Iteration. Alternates greedy improvement with a truncated evaluation
+    of k sweeps that is warm-started from the previous value function, so every
+    evaluation only has to account for the states whose action changed.
+
+    Args:
+        env: The OpenAI envrionment, or a compiled lib.mdp.TabularModel.
+        k: Number of evaluation sweeps after each improvement, or 'adaptive' to sweep
+            until the evaluation residual is a tenth of the improvement residual
+            (at most max_sweeps). k=1 is value iteration, k=inf is policy iteration.
+        discount_factor: gamma discount factor.
+        theta: We stop once the policy is stable and the value function change is
+            less than theta for all states.
+        max_sweeps: Upper bound on the evaluation sweeps per improvement step.
+
+    Returns:
+        A tuple (policy, V).
+        policy is the optimal policy, a matrix of shape [S, A] where each state s
+        contains a valid probability distribution over actions.
+        V is the value function for the optimal policy.
+    """
+    if k != 'adaptive' and k < 1:
+        raise ValueError("k must be a positive number of sweeps or 'adaptive'")
+    model = compile_model(env)
+    V = np.zeros(model.nS)
+    actions = None
+
+    while True:
+        #######################
+        # Policy improvement
+        #######################
+        Q = model.q_values(V, discount_factor)
+        best_a = randargmax_rows(Q, prefer=actions)
+        # The greedy backup is also the first evaluation sweep of the new policy
+        V_next = Q[np.arange(model.nS), best_a]
+        delta = np.max(np.abs(V_next - V))
+        # compare action indices directly, the policy is stable once no state changes its action
+        policy_stable = actions is not None and np.array_equal(best_a, actions)
+        actions = best_a
+        V = V_next
+        if policy_stable and delta < theta:
+            return np.eye(model.nA)[best_a], V
+
+        #######################
+        # Truncated policy evaluation
+        #######################
+        P_pi, r_pi = model.action_model(actions)
+        sweeps = max_sweeps if k == 'adaptive' else min(k, max_sweeps)
+        tolerance = max(theta, 0.1 * delta) if k == 'adaptive' else theta
+        for _ in range(sweeps - 1):
+            V_next = r_pi + discount_factor * P_pi.dot(V)
+            eval_delta = np.max(np.abs(V_next - V))
+            V = V_next
+            if eval_delta < tolerance:
+                break
 
 
 if __name__ == '__main__':
@@ -101,3 +154,9 @@ if __name__ == '__main__':
         ]
     )
     np.testing.assert_array_almost_equal(v, expected_v, decimal=2)
+
+    #################################
+    ### Modified policy iteration
+    #################################
+    policy, v = modified_policy_iteration(env, k='adaptive')
+    np.testing.assert_array_almost_equal(v, expected_v, decimal=2)
@@ -1,16 +1,20 @@
 import numpy as np
 import pprint
 import sys
+import time
 
 if "../" not in sys.path:
     sys.path.append("../")
 from lib.envs.gridworld import GridworldEnv
+from lib.envs.windy_gridworld import WindyGridworldEnv
+from lib.mdp import SweepStats, compile_model, greedy_policy, make_stopping_criterion
 
 pp = pprint.PrettyPrinter(indent=2)
 env = GridworldEnv()
 
 
-def value_iteration(env, theta=0.0001, discount_factor=1.0):
+def value_iteration(env, theta=0.0001, discount_factor=1.0, stopping='max_norm', max_iterations=None,
+                    return_stats=False):
     """
     Value Iteration Algorithm.
 
@@ -19,45 +23,46 @@ def value_iteration(env, theta=0.0001, discount_factor=1.0):
             env.P[s][a] is a list of transition tuples (prob, next_state, reward, done).
             env.nS is a number of states in the environment.
             env.nA is a number of actions in the environment.
+            A compiled lib.mdp.TabularModel is accepted as well.
         theta: We stop evaluation once our value function change is less than theta for all states.
         discount_factor: Gamma discount factor.
+        stopping: Stopping rule, 'max_norm' (default), 'span', a callable stop(V, next_v) -> bool,
+            or None to run exactly max_iterations sweeps.
+        max_iterations: Optional budget of sweeps after which we stop regardless of the stopping rule.
+        return_stats: If True, also return a lib.mdp.SweepStats with the max-norm residual
+            and the wall-clock time of every sweep.
 
     Returns:
-        A tuple (policy, V) of the optimal policy and the optimal value function.
+        A tuple (policy, V) of the optimal policy and the optimal value function,
+        or (policy, V, stats) if return_stats is True.
     """
+    if stopping is None and max_iterations is None:
+        raise ValueError('max_iterations is required when stopping is None')
+    model = compile_model(env)
+    stop = make_stopping_criterion(stopping, theta)
 
-    def one_step_lookahead(s, V):
-        '''
-            One step lookahead, Eq. (4.9)
-        '''
-        action_values = np.zeros(env.nA)
-        for a in env.P[s].keys():
-            v = 0
-            for prob, next_state, reward, done in env.P[s][a]:
-                v += prob * (reward + discount_factor * V[next_state])
-            action_values[a] = v
-        return action_values
-
-    # Initialize value function and random policy
-    V = np.zeros(env.nS)
-    policy = np.zeros([env.nS, env.nA])
+    # Initialize value function
+    V = np.zeros(model.nS)
+    residuals, sweep_times = [], []
 
     while True:
-        next_v = np.zeros_like(V)
-        for s in range(env.nS):
-            action_values = one_step_lookahead(s, V)
-            next_v[s] = np.max(action_values)
+        start = time.perf_counter()
+        # Batched one step lookahead, Eq. (4.9), for every state-action pair at once
+        Q = model.q_values(V, discount_factor)
+        next_v = np.max(Q, axis=1)
+        sweep_times.append(time.perf_counter() - start)
+        residuals.append(np.max(np.abs(next_v - V)))
         # Stop evaluation once change of value funtion is too small otherwise update value function with new approx
-        if np.all(np.abs(next_v - V) < theta):
+        if stop(V, next_v) or (max_iterations is not None and len(residuals) >= max_iterations):
             break
         else:
             V = next_v
 
-    # Output a deterministic policy
-    for s in range(env.nS):
-        action_values = one_step_lookahead(s, V)
-        policy[s] = np.eye(env.nA)[np.argmax(action_values)]
+    # Output a deterministic policy, greedy wrt to the lookahead of the last sweep
+    policy = greedy_policy(Q)
 
+    if return_stats:
+        return policy, V, SweepStats(residuals=np.array(residuals), sweep_times=np.array(sweep_times))
     return policy, V
 
 
@@ -89,3 +94,12 @@ if __name__ == '__main__':
         ]
     )
     np.testing.assert_array_almost_equal(v, expected_v, decimal=2)
+
+    #################################
+    ### Example 6.5 Windy Gridworld
+    #################################
+    # The goal is only marked by done, the shortest path from the start takes 15 steps
+    windy_env = WindyGridworldEnv()
+    _, v = value_iteration(windy_env)
+    start = np.ravel_multi_index((3, 0), windy_env.shape)
+    np.testing.assert_almost_equal(v[start], -15.)
@@ -1,13 +1,14 @@
 import gym
 import matplotlib
-import numpy as np
 import sys
 
-from collections import defaultdict
 
 if "../" not in sys.path:
     sys.path.append("../")
 from lib.envs.blackjack import BlackjackEnv
+from lib.envs.blackjack_model import exact_state_values, value_error
+from lib.episode import EpisodeBuffer
+from lib.tabular import FirstVisitAverager, StateIndexer, ValueTable
 from lib import plotting
 
 matplotlib.style.use('ggplot')
@@ -26,51 +27,37 @@ def mc_first_visit_prediction(policy, env, num_episodes, discount_factor=1.0):
         discount_factor: float, gamma discount factor.
 
     Returns:
-        dict, maps from state -> value.
+        lib.tabular.ValueTable, maps from state -> value like a dict.
         The state is a tuple and the value is a float.
     """
 
-    def generate_episode(env, policy):
+    def generate_episode(env, policy, episode):
         """
-            Generate an `episode` using `policy`
+            Generate an `episode` using `policy`, stored in the reused `episode` buffer
         """
-        episode = []  # a list of state, action, reward items
+        episode.clear()
         state = env.reset()
         # loop until a terminal state is reached
         while True:
             action = policy(state)
             next_state, reward, done, _ = env.step(action)
-            episode.append(state)
-            episode.append(action)
-            episode.append(reward)
+            episode.append(state, action, reward, done)
             if done:
                 break
             state = next_state
         return episode
 
-    returns_sum = defaultdict(int)
-    returns_count = defaultdict(int)
-    V = defaultdict(float)
+    episode = EpisodeBuffer.for_env(env)
+    V = ValueTable(StateIndexer(env.observation_space))
+    # update state values by incrementally averaging the returns over the total time each state was encountered
+    averager = FirstVisitAverager(V, discount_factor)
 
     # Repeat forever (or for `num_episodes` times)
     for e in range(1, num_episodes + 1):
         # Generate an episode using `policy`
-        episode = generate_episode(env, policy)
-        states = set()
-        # Loop for each time step of episode
-        for state_idx in range(0, len(episode), 3):  # states in an episode come every 3 items
-            state = episode[state_idx]
-            # If store not visited yet in this episode, store it
-            if state not in states:
-                states.add(state)
-                # Increment visits for this state
-                returns_count[state] += 1
-                # Increment sum of returns
-                # by going until the end of the episode and summing up every reward along the way
-                returns_sum[state] += sum([discount_factor ** i * episode[reward_idx] for i, reward_idx in
-                                           enumerate(range(state_idx + 2, len(episode), 3))])
-                # update state value by averaging the returns over the total time `state` was encountered
-                V[state] = returns_sum[state] / returns_count[state]
+        episode = generate_episode(env, policy, episode)
+        # Only the first visit of a state in this episode counts
+        averager.update(episode)
     return V
 
 
@@ -83,7 +70,12 @@ def sample_policy(observation):
 
 
 if __name__ == '__main__':
+    # Ground truth from the exact Blackjack dynamics
+    V_true = exact_state_values(sample_policy)
+
     V_10k = mc_first_visit_prediction(sample_policy, env, num_episodes=10000)
+    print("RMS error after 10k episodes: {:.4f}".format(value_error(V_10k, V_true)))
     plotting.plot_value_function(V_10k, title="10k Steps")
     V_500k = mc_first_visit_prediction(sample_policy, env, num_episodes=500000)
+    print("RMS error after 500k episodes: {:.4f}".format(value_error(V_500k, V_true)))
     plotting.plot_value_function(V_500k, title="500k Steps")
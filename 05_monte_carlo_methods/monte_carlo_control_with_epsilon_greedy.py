@@ -1,52 +1,36 @@
 import gym
 import matplotlib
-import numpy as np
 import sys
 
-from collections import defaultdict
 
 if "../" not in sys.path:
     sys.path.append("../")
 from lib.envs.blackjack import BlackjackEnv
 from lib import plotting
-from lib.utils import randargmax
+from lib.episode import EpisodeBuffer
+from lib.tabular import FirstVisitAverager, StateIndexer, ValueTable
+from lib.policies import EpsilonGreedyPolicy
 
 matplotlib.style.use('ggplot')
 
 env = BlackjackEnv()
 
 
-def make_epsilon_greedy_policy(Q, epsilon, nA):
+def make_epsilon_greedy_policy(Q, epsilon):
     """
     Creates an epsilon-greedy policy based on a given Q-function and epsilon.
 
     Args:
-        Q: A dictionary that maps from state -> action-values.
-            Each value is a numpy array of length nA (see below)
-        state: int, state for which the greedy action should be selected
+        Q: A lib.tabular.ValueTable that maps from state -> action-values.
         epsilon: The probability to select a random action . float between 0 and 1.
-        nA: Number of actions in the environment.
 
     Returns:
-        A function that takes the observation as an argument and returns
-        the probabilities for each action in the form of a numpy array of length nA.
+        A lib.policies.EpsilonGreedyPolicy. policy.act(state) samples an action and
+        policy(state) returns the probabilities for each action in the form of a numpy array of length nA.
+        Call policy.refresh(states) after updating the action values of states.
 
     """
-
-    def policy_fn(state):
-        """
-        Return a vector of probabilities over actions given a `state`
-        :param state:
-        :return:
-        """
-        A = np.divide(np.ones(nA, dtype=np.float32) * epsilon, nA)
-        best_action = randargmax(Q[state])
-        # Account that optimal action can be selected randomly
-        # cf. http://www0.cs.ucl.ac.uk/staff/d.silver/web/Teaching_files/control.pdf
-        A[best_action] += (1.0 - epsilon)
-        return A
-
-    return policy_fn
+    return EpsilonGreedyPolicy(Q, epsilon)
 
 
 def mc_control_epsilon_greedy(env, num_episodes, discount_factor=1.0, epsilon=0.1):
@@ -62,34 +46,32 @@ def mc_control_epsilon_greedy(env, num_episodes, discount_factor=1.0, epsilon=0.
 
     Returns:
         A tuple (Q, policy).
-        Q is a dictionary mapping state -> action values.
-        policy is a function that takes an observation as an argument and returns
+        Q is a lib.tabular.ValueTable mapping state -> action values like a dict.
+        policy is a lib.policies.EpsilonGreedyPolicy, calling it with an observation returns
         action probabilities
     """
 
-    def generate_episode(env, policy):
-        episode = []
+    def generate_episode(env, policy, episode):
+        episode.clear()
         state = env.reset()
         while True:
-            probs = policy(state)
-            action = np.random.choice(np.arange(len(probs)), p=probs)  # act epsilon-greedy
+            action = policy.act(state)  # act epsilon-greedy
             next_state, reward, done, _ = env.step(action)
-            episode.append(state)
-            episode.append(action)
-            episode.append(reward)
+            episode.append(state, action, reward, done)
             if done:
                 break
             state = next_state
         return episode
 
-    returns_sum = defaultdict(float)
-    returns_count = defaultdict(float)
+    episode = EpisodeBuffer.for_env(env)
 
-    # The final action-value function, a dictionary that maps state -> action values (numpy array of size nA)
-    Q = defaultdict(lambda: np.zeros(env.action_space.n))
+    # The final action-value function, a table that maps state -> action values (numpy array of size nA)
+    Q = ValueTable(StateIndexer(env.observation_space), env.action_space.n)
+    # update state-action values by incrementally averaging the returns of each state-action pair over all episodes
+    averager = FirstVisitAverager(Q, discount_factor)
 
     # The policy we're following
-    policy = make_epsilon_greedy_policy(Q, epsilon, env.action_space.n)
+    policy = make_epsilon_greedy_policy(Q, epsilon)
 
     # Loop for each episode
     for e in range(1, num_episodes + 1):
@@ -98,22 +80,11 @@ def mc_control_epsilon_greedy(env, num_episodes, discount_factor=1.0, epsilon=0.
             sys.stdout.flush()
 
         # generate an episode following epsilon-greedy `policy`
-        episode = generate_episode(env, policy)
-        state_action = set()  # store unique state-action pairs, because first-visit MC control
-        # Loop for each step of episode
-        for state_idx in range(0, len(episode), 3):
-            state = episode[state_idx]
-            action = episode[state_idx + 1]
-            sap = (state, action)
-            # consider only first-visit of each state-action pair
-            if sap not in state_action:
-                state_action.add(sap)
-                returns_count[sap] += 1
-                # increment sum of returns
-                returns_sum[sap] += sum([discount_factor ** i * episode[reward_idx] for i, reward_idx in
-                                         enumerate(range(state_idx + 2, len(episode), 3))])
-                # update state-action value by averaging the returns of that state-action pair over all episodes
-                Q[state][action] = returns_sum[sap] / returns_count[sap]
+        episode = generate_episode(env, policy, episode)
+        # consider only first-visit of each state-action pair, because first-visit MC control
+        states = averager.update(episode)
+        # the greedy actions of the updated states may have changed
+        policy.refresh(states)
 
     return Q, policy
 
@@ -124,10 +95,7 @@ if __name__ == '__main__':
 
     # Plot the optimal value function:
     # Create value function from action-value function by picking the best action at each state
-    # V = defaultdict(float)
-    # for state, actions in Q.items():
-    #     best_action = np.max(actions)
-    #     V[state] = best_action
+    # V = Q.state_values()
     # plotting.plot_value_function(V, title="Optimal Value Function")
 
     # Plot the optimal policy
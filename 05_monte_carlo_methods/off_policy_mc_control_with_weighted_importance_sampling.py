@@ -0,0 +1,140 @@
+import gym
+import matplotlib
+import numpy as np
+import sys
+
+
+if "../" not in sys.path:
+    sys.path.append("../")
+from lib.envs.blackjack import BlackjackEnv
+from lib import plotting
+from lib.episode import EpisodeBuffer
+from lib.tabular import StateIndexer, ValueTable
+
+matplotlib.style.use('ggplot')
+
+env = BlackjackEnv()
+
+
+def create_random_policy(nA):
+    """
+    Creates a random policy function.
+
+    Args:
+        nA: Number of actions in the environment.
+
+    Returns:
+        A function that takes an observation as input and returns a vector
+        of action probabilities
+    """
+    A = np.ones(nA, dtype=float) / nA
+
+    def policy_fn(observation):
+        return A
+
+    return policy_fn
+
+
+def create_greedy_policy(Q):
+    """
+    Creates a greedy policy based on Q values.
+
+    Args:
+        Q: A dictionary that maps from state -> action values
+
+    Returns:
+        A function that takes an observation as input and returns a vector
+        of action probabilities.
+    """
+
+    def policy_fn(state):
+        A = np.zeros_like(Q[state], dtype=float)
+        # ties are broken consistently, as the target policy has to be deterministic
+        A[np.argmax(Q[state])] = 1.0
+        return A
+
+    return policy_fn
+
+
+def mc_control_importance_sampling(env, num_episodes, behavior_policy, discount_factor=1.0):
+    """
+    Monte Carlo Control Off-Policy Control using Weighted Importance Sampling.
+    Finds an optimal greedy policy.
+
+    Args:
+        env: OpenAI gym environment.
+        num_episodes: Number of episodes to sample.
+        behavior_policy: The behavior to follow while generating episodes.
+            A function that given an observation returns a vector of probabilities for each action.
+        discount_factor: Gamma discount factor.
+
+    Returns:
+        A tuple (Q, policy).
+        Q is a lib.tabular.ValueTable mapping state -> action values like a dict.
+        policy is a function that takes an observation as an argument and returns
+        action probabilities. This is the optimal greedy policy.
+    """
+
+    def generate_episode(env, policy, episode):
+        episode.clear()
+        state = env.reset()
+        while True:
+            probs = policy(state)
+            action = np.random.choice(np.arange(len(probs)), p=probs)
+            next_state, reward, done, _ = env.step(action)
+            # keep b(A_t|S_t) for the importance sampling ratio
+            episode.append(state, action, reward, done, probs[action])
+            if done:
+                break
+            state = next_state
+        return episode
+
+    episode = EpisodeBuffer.for_env(env)
+
+    indexer = StateIndexer(env.observation_space)
+    # The final action-value function, a table that maps state -> action values (numpy array of size nA)
+    Q = ValueTable(indexer, env.action_space.n)
+    # Cumulative sum of the importance sampling weights of each state-action pair
+    C = ValueTable(indexer, env.action_space.n)
+
+    # Our greedy policy we want to learn
+    target_policy = create_greedy_policy(Q)
+
+    # Loop for each episode
+    for e in range(1, num_episodes + 1):
+        if e % 1000 == 0:
+            print("\rEpisode {}/{}.".format(e, num_episodes), end="")
+            sys.stdout.flush()
+
+        # generate an episode following the behavior policy
+        episode = generate_episode(env, behavior_policy, episode)
+        states = episode.state_keys()
+        actions = episode.actions.tolist()
+        rewards = episode.rewards
+        behavior_probs = episode.behavior_probs
+
+        G = 0.
+        W = 1.
+        # Loop for each step of episode, backwards
+        for t in range(len(states) - 1, -1, -1):
+            state, action = states[t], actions[t]
+            G = discount_factor * G + rewards[t]
+            C[state][action] += W
+            # weighted importance sampling update, Eq. (5.7) in incremental form
+            Q[state][action] += (W / C[state][action]) * (G - Q[state][action])
+            # the target policy would not have taken this action, earlier steps get zero weight
+            if action != np.argmax(target_policy(state)):
+                break
+            W = W / behavior_probs[t]
+
+    return Q, target_policy
+
+
+if __name__ == '__main__':
+    random_policy = create_random_policy(env.action_space.n)
+    Q, policy = mc_control_importance_sampling(env, num_episodes=500000, behavior_policy=random_policy)
+
+    # For plotting: Create value function from action-value function
+    # by picking the best action at each state
+    V = Q.state_values()
+    plotting.plot_value_function(V, title="Optimal Value Function")
@@ -0,0 +1,116 @@
+import numpy as np
+
+from lib.stats import EpisodeStatsCollector
+from lib.utils import randargmax_rows
+
+Q_LEARNING = 'q_learning'
+SARSA = 'sarsa'
+
+
+def _epsilon_greedy_rows(q, epsilon, np_random):
+    # One epsilon-greedy action per row of q, epsilon holds the exploration rate of every row
+    actions = randargmax_rows(q, np_random)
+    explore = np_random.rand(len(actions)) < epsilon
+    actions[explore] = np_random.randint(q.shape[1], size=np.count_nonzero(explore))
+    return actions
+
+
+def batch_td_control(env, num_episodes, alpha=0.5, epsilon=0.1, discount_factor=1.0, method=Q_LEARNING,
+                     num_runs=None, seed=None, max_history=None):
+    """
+    Tabular Q-Learning or SARSA for many independent learners at once, e.g. a sweep over
+    alpha, epsilon and gamma.
+
+    Every run has its own copy of the environment, stepped through the [S x A] transition
+    arrays of an ArrayDiscreteEnv, and its own slice of Q. A step takes one epsilon-greedy
+    action per run and applies the TD updates of all runs with fancy indexing. Runs whose
+    episode ended start a new one from env.isd, and stop once they have finished num_episodes.
+
+    Args:
+        env: lib.envs.array_discrete.ArrayDiscreteEnv, e.g. CliffWalkingEnv or WindyGridworldEnv.
+        num_episodes: Number of episodes of every run.
+        alpha: float or ndarray of length R, the step size of every run.
+        epsilon: float or ndarray of length R, chance to sample a random action.
+        discount_factor: float or ndarray of length R, gamma discount factor.
+        method: Q_LEARNING or SARSA.
+        num_runs: Number of runs R, only needed if all hyperparameters are scalars.
+        seed: int, seed of the action selection and the start states.
+        max_history: keep only the last max_history episodes of every run's statistics.
+
+    Returns:
+        A tuple (Q, stats).
+        Q is a ndarray of shape [R, S, A] with the action values of every run.
+        stats is a list of R lib.stats.EpisodeStatsCollector, the episodes of every run.
+    """
+    if method not in (Q_LEARNING, SARSA):
+        raise ValueError("method must be '{}' or '{}'".format(Q_LEARNING, SARSA))
+    if not getattr(env, 'array_dynamics', False):
+        raise ValueError("batch_td_control needs an ArrayDiscreteEnv whose dynamics are its transition arrays, "
+                         "env.P must not have been replaced")
+
+    alpha, epsilon, discount_factor = np.broadcast_arrays(
+        *[np.atleast_1d(np.asarray(x, dtype=float)) for x in (alpha, epsilon, discount_factor)])
+    if num_runs is not None and len(alpha) == 1:
+        alpha, epsilon, discount_factor = [np.repeat(x, num_runs) for x in (alpha, epsilon, discount_factor)]
+    R = len(alpha)
+
+    np_random = np.random.RandomState(seed)
+    next_states, rewards, dones = env.next_states, env.rewards, env.dones
+    isd_cdf = np.cumsum(env.isd)
+
+    def reset(n):
+        return np.minimum(np.searchsorted(isd_cdf, np_random.rand(n), side='right'), env.nS - 1)
+
+    Q = np.zeros((R, env.nS, env.nA))
+    stats = [EpisodeStatsCollector(max_history=max_history) for _ in range(R)]
+    episodes = np.zeros(R, dtype=np.int64)
+    lengths = np.zeros(R, dtype=np.int64)
+    returns = np.zeros(R)
+
+    # Indices of the runs that have not finished all their episodes
+    runs = np.arange(R)
+    states = reset(R)
+    actions = _epsilon_greedy_rows(Q[runs, states], epsilon, np_random)
+
+    while len(runs):
+        # take the actions of all runs, observe rewards and next states
+        next_s = next_states[states, actions]
+        reward = rewards[states, actions]
+        done = dones[states, actions]
+        lengths[runs] += 1
+        returns[runs] += reward
+
+        if method == SARSA:
+            # choose next actions from next states using the policies derived from Q
+            next_actions = _epsilon_greedy_rows(Q[runs, next_s], epsilon[runs], np_random)
+            next_values = Q[runs, next_s, next_actions]
+        else:
+            next_values = np.max(Q[runs, next_s], axis=1)
+
+        # TD update of all runs, terminal transitions bootstrap from zero
+        target = reward + discount_factor[runs] * np.where(done, 0., next_values)
+        Q[runs, states, actions] += alpha[runs] * (target - Q[runs, states, actions])
+
+        states = next_s
+        if np.any(done):
+            for r in runs[done]:
+                stats[r].append(lengths[r], returns[r])
+            finished = runs[done]
+            episodes[finished] += 1
+            lengths[finished] = 0
+            returns[finished] = 0.
+            states[done] = reset(np.count_nonzero(done))
+            active = episodes[runs] < num_episodes
+            runs, states, done = runs[active], states[active], done[active]
+            if method == SARSA:
+                next_actions = next_actions[active]
+
+        if method == SARSA:
+            # runs starting a new episode choose from their start state
+            if np.any(done):
+                next_actions[done] = _epsilon_greedy_rows(Q[runs[done], states[done]], epsilon[runs[done]], np_random)
+            actions = next_actions
+        else:
+            actions = _epsilon_greedy_rows(Q[runs, states], epsilon[runs], np_random)
+
+    return Q, stats
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import numpy as np
+import os
+import shutil
+import tempfile
+from scipy import sparse
+
+from lib.mdp import TabularModel, compile_model
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'RL_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'introduction-reinforcement-learning'))
+
+# Attributes hashed to identify the dynamics of an environment without compiling it
+_DYNAMICS_ATTRIBUTES = ('shape', 'natural', 'next_states', 'rewards', 'dones', 'isd')
+# Bumped whenever the layout or meaning of the compiled model arrays changes
+_MODEL_FORMAT = 2
+
+
+class ModelCache(object):
+    """
+    Content-addressed on-disk cache of compiled TabularModels and solved value functions.
+
+    Entries are stored as .npy files under root/<key>/ and loaded back with
+    np.load(mmap_mode='r'), so a rerun on an unchanged environment does not recompile
+    or re-solve anything, and worker processes loading the same entry share one
+    physical copy of the arrays through the page cache.
+
+    The key hashes the environment class together with its shape and dynamics
+    arrays (next_states, rewards, dones, isd) when it exposes them, and the
+    compiled model otherwise, e.g. after env.P of an ArrayDiscreteEnv was replaced.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR):
+        self.root = root
+
+    def key(self, env):
+        """
+        Hex digest identifying the dynamics of env.
+        """
+        h = hashlib.sha1()
+        h.update('{}.{}:{}'.format(type(env).__module__, type(env).__name__, _MODEL_FORMAT).encode())
+        attributes = [name for name in _DYNAMICS_ATTRIBUTES if getattr(env, name, None) is not None]
+        if not getattr(env, 'array_dynamics', True):
+            # The transition arrays are stale once env.P was replaced
+            attributes = [name for name in attributes if name not in ('next_states', 'rewards', 'dones')]
+        if not any(name in attributes for name in ('next_states', 'rewards', 'dones')):
+            # Fall back to the compiled dynamics, e.g. for environments defined only by env.P
+            model = compile_model(env)
+            for array in (model.P.indptr, model.P.indices, model.P.data, model.R, model.D):
+                h.update(np.ascontiguousarray(array).tobytes())
+        for name in attributes:
+            value = np.asarray(getattr(env, name))
+            h.update(name.encode())
+            h.update(str(value.dtype).encode() + str(value.shape).encode())
+            h.update(np.ascontiguousarray(value).tobytes())
+        return h.hexdigest()
+
+    def compile_model(self, env):
+        """
+        Return the TabularModel of env, memory-mapped from the cache if it was compiled before.
+        The model is also cached on env, so the DP solvers pick it up through lib.mdp.compile_model.
+        """
+        if isinstance(env, TabularModel):
+            return env
+        path = os.path.join(self.root, self.key(env), 'model')
+        if not os.path.isdir(path):
+            model = compile_model(env)
+            self._save(path, {'indptr': model.P.indptr, 'indices': model.P.indices, 'data': model.P.data,
+                              'R': model.R, 'D': model.D}, {'nS': model.nS, 'nA': model.nA})
+        arrays, meta = self._load(path)
+        P = sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                              shape=(meta['nS'] * meta['nA'], meta['nS']), copy=False)
+        env._tabular_model = TabularModel(meta['nS'], meta['nA'], P, arrays['R'], arrays['D'])
+        return env._tabular_model
+
+    def solve(self, solver, env, **kwargs):
+        """
+        Run solver(model, **kwargs) once per environment and arguments, and load its result afterwards.
+
+        Args:
+            solver: DP function returning (policy, V), e.g. value_iteration or policy_improvement.
+            env: OpenAI env, or a compiled lib.mdp.TabularModel.
+            kwargs: Keyword arguments of solver, they must have a stable repr.
+
+        Returns:
+            A tuple (policy, V) of read-only memory-mapped arrays.
+        """
+        model = self.compile_model(env)
+        params = hashlib.sha1(repr(sorted(kwargs.items())).encode()).hexdigest()
+        path = os.path.join(self.root, self.key(env), '{}-{}'.format(solver.__name__, params))
+        if not os.path.isdir(path):
+            policy, V = solver(model, **kwargs)[:2]
+            self._save(path, {'policy': policy, 'V': V}, {'solver': solver.__name__, 'kwargs': repr(kwargs)})
+        arrays, _ = self._load(path)
+        return arrays['policy'], arrays['V']
+
+    def clear(self):
+        """
+        Remove every entry of the cache.
+        """
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _save(self, path, arrays, meta):
+        # Write into a temporary directory first so concurrent readers never see partial entries
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp, name + '.npy'), array)
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        try:
+            os.rename(tmp, path)
+        except OSError:  # another process stored the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _load(self, path):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        arrays = {name[:-len('.npy')]: np.load(os.path.join(path, name), mmap_mode='r')
+                  for name in os.listdir(path) if name.endswith('.npy')}
+        return arrays, meta
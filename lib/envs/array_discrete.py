@@ -0,0 +1,109 @@
+import numpy as np
+from gym.envs.toy_text import discrete
+
+UP = 0
+RIGHT = 1
+DOWN = 2
+LEFT = 3
+
+# (row, column) offset of every action, indexed by UP, RIGHT, DOWN, LEFT
+MOVES = np.array([[-1, 0], [0, 1], [1, 0], [0, -1]])
+
+
+def grid_moves(shape, winds=None):
+    """
+    Next cell of every (cell, action) pair on a grid, computed for all cells at once.
+
+    Args:
+        shape: (rows, columns) of the grid.
+        winds: optional ndarray of the grid's shape, the number of cells the agent
+            is pushed up when moving out of each cell.
+
+    Returns:
+        ndarray, [S x 4] flat indices of the next cells, clipped to the grid boundary.
+    """
+    rows, cols = np.unravel_index(np.arange(np.prod(shape)), shape)
+    next_rows = rows[:, None] + MOVES[:, 0]
+    next_cols = cols[:, None] + MOVES[:, 1]
+    if winds is not None:
+        next_rows = next_rows - np.asarray(winds, dtype=int).reshape(-1, 1)
+    next_rows = np.clip(next_rows, 0, shape[0] - 1)
+    next_cols = np.clip(next_cols, 0, shape[1] - 1)
+    return np.ravel_multi_index((next_rows, next_cols), shape)
+
+
+class ArrayDiscreteEnv(discrete.DiscreteEnv):
+    """
+    DiscreteEnv with deterministic dynamics stored as [S x A] arrays.
+
+    The transition of taking action a in state s is given by next_states[s, a],
+    rewards[s, a] and dones[s, a]. The gym-style env.P dict of transition lists
+    is only built the first time a caller accesses it, so large grids can be
+    constructed and solved without ever allocating S x A Python lists.
+
+    step() and reset() read the arrays directly instead of going through P and
+    categorical_sample. They still draw one uniform number each, like DiscreteEnv,
+    so a seeded env produces the same observations, rewards and done flags. If P is
+    replaced by a dict, e.g. with stochastic transitions, the arrays no longer describe
+    the dynamics: step() falls back to DiscreteEnv.step, tabular_model() compiles the new
+    P and a previously compiled model is dropped.
+    """
+
+    def __init__(self, next_states, rewards, dones, isd):
+        self.next_states = np.asarray(next_states, dtype=np.int64)
+        self.rewards = np.asarray(rewards, dtype=np.float64)
+        self.dones = np.asarray(dones, dtype=bool)
+        self._isd_cdf = np.cumsum(isd)
+        nS, nA = self.next_states.shape
+        super(ArrayDiscreteEnv, self).__init__(nS, nA, None, isd)
+
+    @property
+    def P(self):
+        if self._P is None:
+            self._P = {
+                s: {a: [(1.0, int(self.next_states[s, a]), float(self.rewards[s, a]), bool(self.dones[s, a]))]
+                    for a in range(self.nA)}
+                for s in range(self.nS)}
+        return self._P
+
+    @P.setter
+    def P(self, P):
+        self._P = P
+        # Transitions set from outside may differ from the arrays
+        self._deterministic = P is None
+        # The model compiled by lib.mdp.compile_model describes the old transitions
+        self.__dict__.pop('_tabular_model', None)
+
+    @property
+    def array_dynamics(self):
+        """
+        Whether next_states, rewards and dones describe the dynamics, False once env.P was replaced.
+        """
+        return self._deterministic
+
+    def reset(self):
+        # categorical_sample(isd) with the cumulative sum computed once
+        self.s = int((self._isd_cdf > self.np_random.rand()).argmax())
+        self.lastaction = None
+        return self.s
+
+    def step(self, a):
+        if not self._deterministic:
+            return super(ArrayDiscreteEnv, self).step(a)
+        # Every transition has probability 1.0, the draw only keeps the random stream of DiscreteEnv
+        self.np_random.rand()
+        s = self.s
+        next_state = self.next_states.item(s, a)
+        self.s = next_state
+        self.lastaction = a
+        return (next_state, self.rewards.item(s, a), self.dones.item(s, a), {"prob": 1.0})
+
+    def tabular_model(self):
+        """
+        Compile the dynamics into a lib.mdp.TabularModel straight from the arrays,
+        or from env.P if it was replaced.
+        """
+        from lib.mdp import TabularModel
+        if not self._deterministic:
+            return TabularModel.from_env(self)
+        return TabularModel.from_arrays(self.next_states, self.rewards, self.dones)
@@ -0,0 +1,68 @@
+import numpy as np
+from lib.envs.bandits.env import Environment
+from lib.envs.bandits.action_space import ActionSpace
+
+
+class BatchBanditEnv(Environment):
+    """
+    num_runs independent K-armed bandits stepped in lockstep.
+
+    Every run r has its own reward parameters, row r of reward_parameters (or of both
+    arrays of the (means, stds) tuple for the normal distribution). A step takes one
+    action per run and samples the rewards of all runs with a single NumPy call.
+    """
+
+    def __init__(self, num_runs=100, num_actions=10, distribution="bernoulli", evaluation_seed=None):
+        super(BatchBanditEnv, self).__init__()
+
+        self.num_runs = num_runs
+        self.action_space = ActionSpace(range(num_actions))
+        self.distribution = distribution
+        self.np_random = np.random.RandomState(evaluation_seed)
+
+        shape = (num_runs, num_actions)
+        if distribution == "bernoulli":
+            self.reward_parameters = self.np_random.rand(*shape)
+        elif distribution == "normal":
+            self.reward_parameters = (self.np_random.randn(*shape), self.np_random.rand(*shape))
+        elif distribution == "heavy-tail":
+            self.reward_parameters = self.np_random.rand(*shape)
+        else:
+            raise ValueError("Unsupported reward distribution: {}".format(distribution))
+
+        self.means = self.reward_parameters[0] if distribution == "normal" else self.reward_parameters
+        self.optimal_arm = np.argmax(self.means, axis=1)
+        self._runs = np.arange(num_runs)
+
+    def reset(self):
+        self.is_reset = True
+        return None
+
+    def compute_gap(self, actions):
+        """
+        Regret of every run's action with respect to that run's optimal arm.
+        """
+        return self.means[self._runs, self.optimal_arm] - self.means[self._runs, actions]
+
+    def step(self, actions):
+        """
+        Args:
+            actions: ndarray, vector of length num_runs with the arm pulled in each run.
+
+        Returns:
+            A tuple (None, rewards, done, '') like BanditEnv.step, rewards is a vector of length num_runs.
+        """
+        self.is_reset = False
+        actions = np.asarray(actions)
+        if np.any((actions < 0) | (actions >= self.action_space.n)):
+            raise ValueError("Algorithm chose an invalid action")
+
+        if self.distribution == "bernoulli":
+            rewards = (self.np_random.rand(self.num_runs) < self.reward_parameters[self._runs, actions]).astype(float)
+        elif self.distribution == "normal":
+            means, stds = self.reward_parameters
+            rewards = means[self._runs, actions] + stds[self._runs, actions] * self.np_random.randn(self.num_runs)
+        else:
+            rewards = self.reward_parameters[self._runs, actions] + self.np_random.standard_cauchy(self.num_runs)
+
+        return (None, rewards, self.is_reset, '')
@@ -0,0 +1,153 @@
+import numpy as np
+from lib.envs.bandits.policy import Policy
+from lib.utils import randargmax_rows
+
+
+class BatchPolicy(object):
+    """
+    Bandit policy for num_runs independent runs, with its state held as [R x K] arrays.
+
+    act() chooses the actions of all runs at once and feedback(actions, rewards) takes
+    vectors of length num_runs, as expected by Experiment.run_bandit_batch.
+    view(run) returns a single-run Policy with the usual act()/feedback() interface
+    that reads and writes row `run` of the batch state.
+    """
+
+    name = "Batch Policy"
+
+    def __init__(self, num_runs, num_actions, seed=None):
+        self.num_runs = num_runs
+        self.num_actions = num_actions
+        self.np_random = np.random.RandomState(seed)
+        self.total_rewards = np.zeros((num_runs, num_actions))
+        self.total_counts = np.zeros((num_runs, num_actions))
+
+    def act(self):
+        return self.select(slice(None))
+
+    def feedback(self, actions, rewards):
+        self.update(slice(None), actions, rewards)
+
+    def select(self, runs):
+        """
+        Choose an action for every run selected by runs (a slice or index array).
+        """
+        raise NotImplementedError('Inheriting classes must override select.')
+
+    def update(self, runs, actions, rewards):
+        rows = np.arange(self.num_runs)[runs]
+        self.total_rewards[rows, actions] += rewards
+        self.total_counts[rows, actions] += 1
+
+    def view(self, run):
+        return PolicyView(self, run)
+
+    def _averages(self, runs, unvisited_value):
+        counts = self.total_counts[runs]
+        averages = np.divide(self.total_rewards[runs], counts, out=np.zeros(counts.shape), where=counts > 0)
+        if unvisited_value is None:
+            # Unvisited arms look as good as the best visited one
+            unvisited_value = np.max(averages, axis=1, keepdims=True)
+        return np.where(counts > 0, averages, unvisited_value)
+
+
+class PolicyView(Policy):
+    """
+    Single-run view of a BatchPolicy.
+    """
+
+    def __init__(self, batch, run):
+        Policy.__init__(self, batch.num_actions)
+        self.batch = batch
+        self.run = run
+        self.name = batch.name
+
+    @property
+    def total_counts(self):
+        return self.batch.total_counts[self.run]
+
+    def act(self):
+        return int(self.batch.select(slice(self.run, self.run + 1))[0])
+
+    def feedback(self, action, reward):
+        self.batch.update(slice(self.run, self.run + 1), np.array([action]), np.array([reward]))
+
+
+class BatchEpsilonGreedy(BatchPolicy):
+    def __init__(self, num_runs, num_actions, epsilon, seed=None):
+        BatchPolicy.__init__(self, num_runs, num_actions, seed)
+        if epsilon is None or epsilon < 0 or epsilon > 1:
+            raise ValueError("EpsilonGreedy: Invalid value of epsilon")
+        self.epsilon = epsilon
+        self.name = "Epsilon Greedy"
+
+    def select(self, runs):
+        actions = randargmax_rows(self._averages(runs, None), self.np_random)
+        explore = self.np_random.rand(len(actions)) < self.epsilon
+        actions[explore] = self.np_random.randint(self.num_actions, size=np.count_nonzero(explore))
+        return actions
+
+
+class BatchGreedy(BatchEpsilonGreedy):
+    def __init__(self, num_runs, num_actions, seed=None):
+        BatchEpsilonGreedy.__init__(self, num_runs, num_actions, 0., seed)
+        self.name = "Greedy"
+
+
+class BatchOptimisticGreedy(BatchPolicy):
+    def __init__(self, num_runs, num_actions, initial_value, seed=None):
+        BatchPolicy.__init__(self, num_runs, num_actions, seed)
+        self.initial_value = initial_value
+        self.name = "Optimistic Greedy"
+
+    def select(self, runs):
+        return randargmax_rows(self._averages(runs, self.initial_value), self.np_random)
+
+
+class BatchUCB(BatchPolicy):
+    def __init__(self, num_runs, num_actions, seed=None):
+        BatchPolicy.__init__(self, num_runs, num_actions, seed)
+        self.name = "UCB"
+        self.round = np.zeros(num_runs, dtype=np.int64)
+
+    def select(self, runs):
+        self.round[runs] += 1
+        rounds = self.round[runs]
+        counts = self.total_counts[runs]
+        # At round t, play the arms with maximum average and exploration bonus
+        bonus = np.sqrt(2 * np.log(rounds)[:, None] / np.maximum(counts, 1))
+        actions = np.argmax(self._averages(runs, 0.5) + bonus, axis=1)
+        # The first k rounds, where k is the number of arms/actions, play each arm/action once
+        warmup = rounds <= self.num_actions
+        actions[warmup] = (rounds[warmup] - 1) % self.num_actions
+        return actions
+
+
+class BatchThompsonBeta(BatchPolicy):
+    def __init__(self, num_runs, num_actions, seed=None):
+        BatchPolicy.__init__(self, num_runs, num_actions, seed)
+        self.name = "Thompson Beta"
+        # PRIOR Hyper-params: successes = 1; failures = 1
+        self.successes = np.ones((num_runs, num_actions), dtype=np.int64)
+        self.failures = np.ones((num_runs, num_actions), dtype=np.int64)
+
+    def select(self, runs):
+        return np.argmax(self.np_random.beta(1 + self.successes[runs], 1 + self.failures[runs]), axis=1)
+
+    def update(self, runs, actions, rewards):
+        BatchPolicy.update(self, runs, actions, rewards)
+        rows = np.arange(self.num_runs)[runs]
+        success = np.asarray(rewards) > 0
+        self.successes[rows, actions] += success
+        self.failures[rows, actions] += ~success
+
+
+class BatchRoundRobin(BatchPolicy):
+    def __init__(self, num_runs, num_actions, seed=None):
+        BatchPolicy.__init__(self, num_runs, num_actions, seed)
+        self.name = "Round Robin"
+        self.previous_action = np.full(num_runs, -1, dtype=np.int64)
+
+    def select(self, runs):
+        self.previous_action[runs] = (self.previous_action[runs] + 1) % self.num_actions
+        return self.previous_action[runs].copy()
@@ -1,4 +1,5 @@
 import gym
+import numpy as np
 from gym import spaces
 from gym.utils import seeding
 
@@ -120,3 +121,129 @@ class BlackjackEnv(gym.Env):
             self.player.append(draw_card(self.np_random))
 
         return self._get_obs()
+
+
+class VectorBlackjackEnv(gym.Env):
+    """Blackjack environment playing num_envs games in lockstep.
+
+    The rules are those of BlackjackEnv, including the `natural` payout, but
+    hands are kept as integer arrays instead of lists of cards: the sum of the
+    player's cards counting aces as 1, whether the player holds an ace, whether
+    the hand is still a natural, and the dealer's showing and hidden cards.
+    Cards are drawn for all games that need one with a single call.
+
+    Observations are [num_envs x 3] integer arrays whose rows are
+    (player sum, dealer showing card, usable ace). Games that end in a step are
+    reset automatically, so the observation returned for them is the first
+    observation of the next game.
+    """
+    def __init__(self, num_envs=1, natural=False):
+        self.num_envs = num_envs
+        self.action_space = spaces.Discrete(2)
+        self.observation_space = spaces.Tuple((
+            spaces.Discrete(32),
+            spaces.Discrete(11),
+            spaces.Discrete(2)))
+        self._seed()
+
+        # Flag to payout 1.5 on a "natural" blackjack win, like casino rules
+        self.natural = natural
+        self.nA = 2
+
+        self.player_sum = np.zeros(num_envs, dtype=np.int64)
+        self.player_ace = np.zeros(num_envs, dtype=bool)
+        self.player_natural = np.zeros(num_envs, dtype=bool)
+        self.dealer_showing = np.zeros(num_envs, dtype=np.int64)
+        self.dealer_hidden = np.zeros(num_envs, dtype=np.int64)
+        self._reset(np.ones(num_envs, dtype=bool))
+
+    def seed(self, seed=None):
+        return self._seed(seed)
+
+    def reset(self):
+        self._reset(np.ones(self.num_envs, dtype=bool))
+        return self._get_obs()
+
+    def step(self, actions):
+        """
+        Args:
+            actions: ndarray, vector of length num_envs with 1 to hit and 0 to stick.
+
+        Returns:
+            A tuple (obs, rewards, dones, info) of arrays over the games.
+        """
+        actions = np.asarray(actions)
+        rewards = np.zeros(self.num_envs)
+        hit = actions == 1
+
+        # hit: add a card to players hand, the game ends if the player busts
+        cards = self._draw_cards(np.count_nonzero(hit))
+        self.player_sum[hit] += cards
+        self.player_ace[hit] |= cards == 1
+        self.player_natural[hit] = False
+        bust = hit & (_hand_sum(self.player_sum, self.player_ace) > 21)
+        rewards[bust] = -1.
+
+        # stick: play out the dealers hand, and score
+        stick = ~hit
+        dealer_sum = self.dealer_showing[stick] + self.dealer_hidden[stick]
+        dealer_ace = (self.dealer_showing[stick] == 1) | (self.dealer_hidden[stick] == 1)
+        drawing = _hand_sum(dealer_sum, dealer_ace) < 17
+        while np.any(drawing):
+            cards = self._draw_cards(np.count_nonzero(drawing))
+            dealer_sum[drawing] += cards
+            dealer_ace[drawing] |= cards == 1
+            drawing = _hand_sum(dealer_sum, dealer_ace) < 17
+        player_score = _hand_score(self.player_sum[stick], self.player_ace[stick])
+        stick_rewards = np.sign(player_score - _hand_score(dealer_sum, dealer_ace)).astype(float)
+        if self.natural:
+            stick_rewards[self.player_natural[stick] & (stick_rewards == 1)] = 1.5
+        rewards[stick] = stick_rewards
+
+        dones = bust | stick
+        self._reset(dones)
+        return self._get_obs(), rewards, dones, {}
+
+    def _seed(self, seed=None):
+        self.np_random, seed = seeding.np_random(seed)
+        return [seed]
+
+    def _draw_cards(self, n):
+        return self.np_random.choice(deck, size=n)
+
+    def _get_obs(self):
+        return np.stack([_hand_sum(self.player_sum, self.player_ace), self.dealer_showing,
+                         _usable_ace(self.player_sum, self.player_ace)], axis=1).astype(np.int64)
+
+    def _reset(self, mask):
+        n = np.count_nonzero(mask)
+        dealer = self._draw_cards(2 * n).reshape(n, 2)
+        player = self._draw_cards(2 * n).reshape(n, 2)
+        self.dealer_showing[mask] = dealer[:, 0]
+        self.dealer_hidden[mask] = dealer[:, 1]
+        player_sum = player.sum(axis=1)
+        player_ace = np.any(player == 1, axis=1)
+        self.player_natural[mask] = player_ace & (player_sum == 11)
+
+        # Auto-draw another card if the score is less than 12
+        drawing = _hand_sum(player_sum, player_ace) < 12
+        while np.any(drawing):
+            cards = self._draw_cards(np.count_nonzero(drawing))
+            player_sum[drawing] += cards
+            player_ace[drawing] |= cards == 1
+            drawing = _hand_sum(player_sum, player_ace) < 12
+        self.player_sum[mask] = player_sum
+        self.player_ace[mask] = player_ace
+
+
+def _usable_ace(raw_sum, has_ace):  # Vectorized usable_ace on the sum of cards counting aces as 1
+    return has_ace & (raw_sum + 10 <= 21)
+
+
+def _hand_sum(raw_sum, has_ace):  # Vectorized sum_hand
+    return np.where(_usable_ace(raw_sum, has_ace), raw_sum + 10, raw_sum)
+
+
+def _hand_score(raw_sum, has_ace):  # Vectorized score, 0 if bust
+    total = _hand_sum(raw_sum, has_ace)
+    return np.where(total > 21, 0, total)
@@ -0,0 +1,177 @@
+import numpy as np
+from scipy import sparse
+
+from lib.envs.blackjack import deck
+from lib.mdp import TabularModel, solve_policy_values
+
+# Probability of drawing each card value 1-10 from the infinite deck
+CARD_PROBS = np.bincount(deck, minlength=11)[1:] / float(len(deck))
+CARDS = np.arange(1, 11)
+
+# Final dealer totals 17-21, the last entry is a dealer bust
+DEALER_OUTCOMES = [17, 18, 19, 20, 21, 'bust']
+
+PLAYER_SUMS = range(12, 22)
+DEALER_CARDS = range(1, 11)
+
+# Observations (player sum, dealer showing, usable ace) are states 0-199, state 200 ends the episode
+nS = len(PLAYER_SUMS) * len(DEALER_CARDS) * 2 + 1
+TERMINAL = nS - 1
+nA = 2
+STICK = 0
+HIT = 1
+
+
+def state_to_index(state):
+    """
+    Index of a BlackjackEnv observation (player sum, dealer showing, usable ace) in the tabular model.
+    """
+    score, dealer_score, usable_ace = state
+    return (score - 12) * 20 + (dealer_score - 1) * 2 + int(usable_ace)
+
+
+def index_to_state(index):
+    """
+    BlackjackEnv observation of a non-terminal state index of the tabular model.
+    """
+    score, rest = divmod(index, 20)
+    dealer_score, usable_ace = divmod(rest, 2)
+    return (score + 12, dealer_score + 1, bool(usable_ace))
+
+
+def _hand_total(raw_sum, has_ace):
+    # Sum of the cards counting aces as 1 -> hand total and whether the ace is usable
+    if has_ace and raw_sum + 10 <= 21:
+        return raw_sum + 10, True
+    return raw_sum, False
+
+
+def dealer_outcome_probabilities():
+    """
+    Exact distribution of the dealer's final total for every showing card, computed by
+    recursion over the dealer's hand since the deck is infinite (cards are drawn with replacement).
+
+    Returns:
+        ndarray, [10 x 6] matrix whose row c - 1 is the distribution over DEALER_OUTCOMES
+        (totals 17 to 21, then bust) when the dealer shows card c.
+    """
+    memo = {}
+
+    def outcome(raw_sum, has_ace):
+        if (raw_sum, has_ace) not in memo:
+            total, _ = _hand_total(raw_sum, has_ace)
+            probs = np.zeros(len(DEALER_OUTCOMES))
+            if total > 21:
+                probs[-1] = 1.
+            elif total >= 17:
+                probs[total - 17] = 1.
+            else:
+                # The dealer draws until their sum is 17 or greater
+                for card, p in zip(CARDS, CARD_PROBS):
+                    probs += p * outcome(raw_sum + card, has_ace or card == 1)
+            memo[(raw_sum, has_ace)] = probs
+        return memo[(raw_sum, has_ace)]
+
+    # The hidden card is just the first card the dealer draws
+    return np.array([outcome(showing, showing == 1) for showing in DEALER_CARDS])
+
+
+def blackjack_model():
+    """
+    Blackjack with the rules of BlackjackEnv(natural=False) as a TabularModel.
+
+    Sticking ends the episode with the expected reward against the dealer's final-total
+    distribution. Hitting moves to the next player sum, or ends the episode with
+    reward -1 on a bust. Sums below 12 never occur since the environment keeps drawing
+    for the player until the sum reaches 12.
+
+    Returns:
+        TabularModel with nS = 201 states, see state_to_index, and nA = 2 actions (STICK, HIT).
+    """
+    dealer = dealer_outcome_probabilities()
+    rows, next_states, probs = [], [], []
+    R = np.zeros(nS * nA)
+
+    for index in range(TERMINAL):
+        score, dealer_score, usable_ace = index_to_state(index)
+
+        # stick: compare with the dealer's final total, a dealer bust is a win
+        outcomes = dealer[dealer_score - 1]
+        totals = np.array(DEALER_OUTCOMES[:-1])
+        R[index * nA + STICK] = (outcomes[-1] + outcomes[:-1][totals < score].sum()
+                                 - outcomes[:-1][totals > score].sum())
+        rows.append(index * nA + STICK)
+        next_states.append(TERMINAL)
+        probs.append(1.)
+
+        # hit: a usable ace counts as 11, so the raw sum counts it as 1
+        raw_sum = score - 10 if usable_ace else score
+        for card, p in zip(CARDS, CARD_PROBS):
+            total, usable = _hand_total(raw_sum + card, usable_ace or card == 1)
+            rows.append(index * nA + HIT)
+            probs.append(p)
+            if total > 21:
+                next_states.append(TERMINAL)
+                R[index * nA + HIT] -= p
+            else:
+                next_states.append(state_to_index((total, dealer_score, usable)))
+
+    # The terminal state is absorbing with zero reward
+    for a in range(nA):
+        rows.append(TERMINAL * nA + a)
+        next_states.append(TERMINAL)
+        probs.append(1.)
+
+    rows, next_states, probs = np.array(rows), np.array(next_states), np.array(probs)
+    # Reaching the terminal state ends the episode, so only the other transitions bootstrap
+    done = next_states == TERMINAL
+    D = np.bincount(rows[done], weights=probs[done], minlength=nS * nA)
+    P = sparse.coo_matrix((probs[~done], (rows[~done], next_states[~done])), shape=(nS * nA, nS)).tocsr()
+    return TabularModel(nS, nA, P, R, D)
+
+
+def exact_state_values(policy, model=None):
+    """
+    Exact state-value function of a deterministic policy.
+
+    Args:
+        policy: fn, maps an observation to an action, as used by the MC prediction scripts.
+        model: TabularModel from blackjack_model(), built if not given.
+
+    Returns:
+        dict, maps from state -> value like the output of MC prediction.
+    """
+    model = model or blackjack_model()
+    policy_matrix = np.zeros((nS, nA))
+    for index in range(TERMINAL):
+        policy_matrix[index, policy(index_to_state(index))] = 1.
+    policy_matrix[TERMINAL, STICK] = 1.
+    V = solve_policy_values(model, policy_matrix, method='direct')
+    return {index_to_state(index): V[index] for index in range(TERMINAL)}
+
+
+def optimal_action_values(model=None):
+    """
+    Exact optimal action-value function by value iteration. Every hit increases the
+    player's sum, so the model is acyclic and the iteration is exact after at most 11 sweeps.
+
+    Args:
+        model: TabularModel from blackjack_model(), built if not given.
+
+    Returns:
+        dict, maps from state -> action values (numpy array of size nA) like the output of MC control.
+    """
+    model = model or blackjack_model()
+    V = np.zeros(nS)
+    for _ in range(len(PLAYER_SUMS) + 1):
+        Q = model.q_values(V)
+        V = np.max(Q, axis=1)
+    return {index_to_state(index): Q[index] for index in range(TERMINAL)}
+
+
+def value_error(V, V_true):
+    """
+    Root mean squared error of an estimated value function over the states of V_true.
+    States missing from V count as 0, like an unvisited defaultdict entry.
+    """
+    return np.sqrt(np.mean([(V.get(state, 0.) - value) ** 2 for state, value in V_true.items()]))
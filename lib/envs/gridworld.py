@@ -1,13 +1,8 @@
 import numpy as np
 import sys
-from gym.envs.toy_text import discrete
+from lib.envs.array_discrete import ArrayDiscreteEnv, grid_moves
 
-UP = 0
-RIGHT = 1
-DOWN = 2
-LEFT = 3
-
-class GridworldEnv(discrete.DiscreteEnv):
+class GridworldEnv(ArrayDiscreteEnv):
     """
     Grid World environment from Sutton's Reinforcement Learning book chapter 4.
     You are an agent on an MxN grid and your goal is to reach the terminal
@@ -36,51 +31,25 @@ class GridworldEnv(discrete.DiscreteEnv):
         self.shape = shape
 
         nS = np.prod(shape)
-        nA = 4
-
-        MAX_Y = shape[0]
-        MAX_X = shape[1]
-
-        P = {}
-        grid = np.arange(nS).reshape(shape)
-        it = np.nditer(grid, flags=['multi_index'])
-
-        while not it.finished:
-            s = it.iterindex
-            y, x = it.multi_index
-
-            P[s] = {a : [] for a in range(nA)}
 
-            is_done = lambda s: s == 0 or s == (nS - 1)
-            reward = 0.0 if is_done(s) else -1.0
+        # Transitions of all states at once, actions going off the edge leave the state unchanged
+        next_states = grid_moves(shape)
+        is_done = lambda s: (s == 0) | (s == (nS - 1))
+        dones = is_done(next_states)
+        rewards = np.full(next_states.shape, -1.0)
 
-            # We're stuck in a terminal state
-            if is_done(s):
-                P[s][UP] = [(1.0, s, reward, True)]
-                P[s][RIGHT] = [(1.0, s, reward, True)]
-                P[s][DOWN] = [(1.0, s, reward, True)]
-                P[s][LEFT] = [(1.0, s, reward, True)]
-            # Not a terminal state
-            else:
-                ns_up = s if y == 0 else s - MAX_X
-                ns_right = s if x == (MAX_X - 1) else s + 1
-                ns_down = s if y == (MAX_Y - 1) else s + MAX_X
-                ns_left = s if x == 0 else s - 1
-                P[s][UP] = [(1.0, ns_up, reward, is_done(ns_up))]
-                P[s][RIGHT] = [(1.0, ns_right, reward, is_done(ns_right))]
-                P[s][DOWN] = [(1.0, ns_down, reward, is_done(ns_down))]
-                P[s][LEFT] = [(1.0, ns_left, reward, is_done(ns_left))]
-
-            it.iternext()
+        # We're stuck in a terminal state
+        terminals = np.array([0, nS - 1])
+        next_states[terminals] = terminals[:, None]
+        rewards[terminals] = 0.0
+        dones[terminals] = True
 
         # Initial state distribution is uniform
         isd = np.ones(nS) / nS
 
-        # We expose the model of the environment for educational purposes
+        # We expose the model of the environment for educational purposes through env.P
         # This should not be used in any model-free learning algorithm
-        self.P = P
-
-        super(GridworldEnv, self).__init__(nS, nA, P, isd)
+        super(GridworldEnv, self).__init__(next_states, rewards, dones, isd)
 
     def _render(self, mode='human', close=False):
         if close:
@@ -0,0 +1,168 @@
+import numpy as np
+
+# Buffers up to this size compute their returns with a plain Python loop
+SCALAR_RETURNS_MAX_STEPS = 32
+
+
+class EpisodeBuffer(object):
+    """
+    Columnar buffer of transitions for one or more episodes.
+
+    Every column (states, actions, rewards, dones, behavior_probs) is a preallocated
+    NumPy array that doubles its capacity when full, so appending a step costs no
+    per-step tuple or list allocation. The column properties return zero-copy views
+    of the filled part. Calling clear() keeps the memory for the next episode.
+
+    Step t holds the state S_t, the action A_t taken in it, the reward R_{t+1}
+    that followed, whether the episode ended after it and the probability b(A_t|S_t)
+    of the behavior policy.
+    """
+
+    def __init__(self, capacity=64, state_shape=(), state_dtype=np.int64):
+        self.state_shape = tuple(state_shape)
+        self._states = np.zeros((capacity,) + self.state_shape, dtype=state_dtype)
+        self._actions = np.zeros(capacity, dtype=np.int64)
+        self._rewards = np.zeros(capacity)
+        self._dones = np.zeros(capacity, dtype=bool)
+        self._behavior_probs = np.ones(capacity)
+        self._size = 0
+
+    @classmethod
+    def for_env(cls, env, capacity=64):
+        """
+        Buffer whose state column fits the observations of env, one integer per
+        component for spaces.Tuple observations such as Blackjack's, else a single integer.
+        """
+        spaces = getattr(env.observation_space, 'spaces', None)
+        return cls(capacity, state_shape=() if spaces is None else (len(spaces),))
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def states(self):
+        return self._states[:self._size]
+
+    @property
+    def actions(self):
+        return self._actions[:self._size]
+
+    @property
+    def rewards(self):
+        return self._rewards[:self._size]
+
+    @property
+    def dones(self):
+        return self._dones[:self._size]
+
+    @property
+    def behavior_probs(self):
+        return self._behavior_probs[:self._size]
+
+    def append(self, state, action, reward, done=False, behavior_prob=1.0):
+        if self._size == len(self._actions):
+            self._grow(max(1, 2 * self._size))
+        t = self._size
+        self._states[t] = state
+        self._actions[t] = action
+        self._rewards[t] = reward
+        self._dones[t] = done
+        self._behavior_probs[t] = behavior_prob
+        self._size += 1
+
+    def extend(self, other):
+        """
+        Append all steps of another buffer, e.g. to batch episodes generated separately.
+        """
+        n = len(other)
+        if self._size + n > len(self._actions):
+            self._grow(max(2 * len(self._actions), self._size + n))
+        end = self._size + n
+        self._states[self._size:end] = other.states
+        self._actions[self._size:end] = other.actions
+        self._rewards[self._size:end] = other.rewards
+        self._dones[self._size:end] = other.dones
+        self._behavior_probs[self._size:end] = other.behavior_probs
+        self._size = end
+
+    @classmethod
+    def concatenate(cls, buffers):
+        """
+        A single buffer holding the steps of all buffers in order.
+        """
+        buffers = list(buffers)
+        template = buffers[0]
+        result = cls(max(1, sum(len(b) for b in buffers)), template.state_shape, template._states.dtype)
+        for buffer in buffers:
+            result.extend(buffer)
+        return result
+
+    def state_keys(self):
+        """
+        States as hashable Python values (tuples for tuple observations), e.g. for dictionary lookups.
+        """
+        states = self.states.tolist()
+        return list(map(tuple, states)) if self.state_shape else states
+
+    def clear(self):
+        self._size = 0
+
+    def episode_bounds(self):
+        """
+        (start, end) step indices of every complete episode, delimited by the done flags.
+        """
+        ends = np.flatnonzero(self.dones) + 1
+        starts = np.concatenate(([0], ends[:-1]))
+        return list(zip(starts, ends))
+
+    def reversed(self):
+        """
+        Iterate over the steps from the last to the first as (state, action, reward) tuples.
+        """
+        for t in range(self._size - 1, -1, -1):
+            yield self._states[t], self._actions[t], self._rewards[t]
+
+    def backward_steps(self):
+        """
+        Step indices grouped by their distance to the end of their episode, for k = 1, 2, ...
+        the steps followed by exactly k more steps. Backward recursions x_t = f(x_{t+1})
+        then run as one array operation per group instead of one Python iteration per step.
+        A trailing episode without a done flag ends at the last step.
+        """
+        if self._size == 0:
+            return []
+        ends = np.flatnonzero(self.dones)
+        if len(ends) == 0 or ends[-1] != self._size - 1:
+            ends = np.append(ends, self._size - 1)
+        steps = np.arange(self._size)
+        to_go = ends[np.searchsorted(ends, steps)] - steps
+        order = np.argsort(to_go, kind='stable')
+        bounds = np.searchsorted(to_go[order], np.arange(1, to_go.max() + 1))
+        return np.split(order, bounds)[1:]
+
+    def returns(self, discount_factor=1.0):
+        """
+        Return G_t following every step, computed backwards from the end of every episode.
+        """
+        if self._size <= SCALAR_RETURNS_MAX_STEPS:
+            # A single short episode is cheaper to walk in Python than to group
+            G = np.zeros(self._size)
+            g = 0.
+            rewards, dones = self.rewards.tolist(), self.dones.tolist()
+            for t in range(self._size - 1, -1, -1):
+                if dones[t]:
+                    g = 0.
+                g = rewards[t] + discount_factor * g
+                G[t] = g
+            return G
+        G = self.rewards.copy()
+        for steps in self.backward_steps():
+            G[steps] += discount_factor * G[steps + 1]
+        return G
+
+    def _grow(self, capacity):
+        for name in ('_states', '_actions', '_rewards', '_dones', '_behavior_probs'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
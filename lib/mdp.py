@@ -0,0 +1,296 @@
+import numpy as np
+from collections import namedtuple
+from scipy import sparse
+from scipy.sparse import linalg as splinalg
+
+SweepStats = namedtuple("SweepStats", ["residuals", "sweep_times"])
+
+# Largest state space for which policy evaluation falls back to a dense solve with method='auto'
+DENSE_SOLVE_MAX_STATES = 2000
+
+
+class TabularModel(object):
+    """
+    Array representation of the dynamics of a finite MDP.
+
+    The nested env.P[s][a] lists of (prob, next_state, reward, done) tuples are
+    flattened once into a sparse transition matrix and reward/termination vectors,
+    so that a full Bellman backup becomes a single sparse matrix-vector product.
+    Row s * nA + a of every array describes the state-action pair (s, a).
+
+    P only holds the transitions that continue the episode. A transition with done=True
+    contributes its reward to R and its probability to D, but no successor value, so
+    the backups treat episodic tasks like CliffWalking, whose goal is only marked by
+    done, as episodic.
+
+    Attributes:
+        nS: int, number of states.
+        nA: int, number of actions.
+        P: scipy.sparse.csr_matrix, [S*A x S] probabilities p(s', not done|s, a) of the
+            transitions that do not end the episode.
+        R: ndarray, vector of length S*A with the expected reward r(s, a).
+        D: ndarray, vector of length S*A with the probability that (s, a) ends the episode.
+    """
+
+    def __init__(self, nS, nA, P, R, D=None):
+        self.nS = int(nS)
+        self.nA = int(nA)
+        self.P = sparse.csr_matrix(P)
+        self.R = np.asarray(R, dtype=np.float64)
+        self.D = np.zeros(self.nS * self.nA) if D is None else np.asarray(D, dtype=np.float64)
+
+        if self.P.shape != (self.nS * self.nA, self.nS):
+            raise ValueError('P must have shape (nS * nA, nS), got {}'.format(self.P.shape))
+        if self.R.shape != (self.nS * self.nA,) or self.D.shape != (self.nS * self.nA,):
+            raise ValueError('R and D must be vectors of length nS * nA')
+
+    @classmethod
+    def from_env(cls, env):
+        """
+        Compile the transition model of a DiscreteEnv.
+
+        Args:
+            env: OpenAI env, env.P[s][a] is a list of transition tuples (prob, next_state, reward, done).
+
+        Returns:
+            TabularModel holding the same dynamics as env.P.
+        """
+        nS, nA = env.nS, env.nA
+        rows, next_states, probs, rewards, dones = [], [], [], [], []
+        for s in range(nS):
+            for a in range(nA):
+                for prob, next_state, reward, done in env.P[s][a]:
+                    rows.append(s * nA + a)
+                    next_states.append(next_state)
+                    probs.append(prob)
+                    rewards.append(reward)
+                    dones.append(done)
+
+        rows = np.array(rows, dtype=np.int64)
+        probs = np.array(probs, dtype=np.float64)
+        dones = np.array(dones, dtype=bool)
+        # Terminating transitions do not bootstrap, duplicate (row, next_state) entries
+        # are summed by the COO -> CSR conversion
+        cont = ~dones
+        P = sparse.coo_matrix((probs[cont], (rows[cont], np.array(next_states, dtype=np.int64)[cont])),
+                              shape=(nS * nA, nS))
+        R = np.bincount(rows, weights=probs * np.array(rewards, dtype=np.float64), minlength=nS * nA)
+        D = np.bincount(rows, weights=probs * dones, minlength=nS * nA)
+        return cls(nS, nA, P.tocsr(), R, D)
+
+    @classmethod
+    def from_arrays(cls, next_states, rewards, dones):
+        """
+        Build the model of deterministic dynamics given as arrays.
+
+        Args:
+            next_states: ndarray, [S x A] next state of every state-action pair.
+            rewards: ndarray, [S x A] reward of every state-action pair.
+            dones: ndarray, [S x A] whether every state-action pair ends the episode.
+
+        Returns:
+            TabularModel with one transition of probability 1 per state-action pair that
+            does not end the episode.
+        """
+        nS, nA = next_states.shape
+        dones = np.asarray(dones, dtype=bool).reshape(-1)
+        rows = np.flatnonzero(~dones)
+        P = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, np.asarray(next_states).reshape(-1)[rows])), shape=(nS * nA, nS))
+        return cls(nS, nA, P, np.reshape(rewards, -1), dones.astype(np.float64))
+
+    def q_values(self, V, discount_factor=1.0):
+        """
+        One step lookahead for all states at once, Eq. (4.9). Transitions that end the
+        episode only contribute their reward.
+
+        Args:
+            V: ndarray, vector of length S with the current value function.
+            discount_factor: float, Gamma discount factor.
+
+        Returns:
+            ndarray, [S x A] matrix of action values.
+        """
+        return (self.R + discount_factor * self.P.dot(V)).reshape(self.nS, self.nA)
+
+    def policy_model(self, policy):
+        """
+        Marginalize the dynamics over a stochastic policy.
+
+        Args:
+            policy: ndarray, [S x A] matrix representing the policy.
+
+        Returns:
+            A tuple (P_pi, r_pi) of the [S x S] sparse state transition matrix and the
+            length S expected reward vector when following policy.
+        """
+        weights = np.asarray(policy, dtype=np.float64).reshape(-1)
+        pi = sparse.csr_matrix(
+            (weights, np.arange(self.nS * self.nA), np.arange(0, self.nS * self.nA + 1, self.nA)),
+            shape=(self.nS, self.nS * self.nA))
+        return pi.dot(self.P).tocsr(), pi.dot(self.R)
+
+    def action_model(self, actions):
+        """
+        Dynamics of a deterministic policy, cheaper than policy_model on a one-hot matrix.
+
+        Args:
+            actions: ndarray, vector of length S with the action taken in each state.
+
+        Returns:
+            A tuple (P_pi, r_pi) of the [S x S] sparse state transition matrix and the
+            length S expected reward vector when following the actions.
+        """
+        rows = np.arange(self.nS) * self.nA + actions
+        return self.P[rows], self.R[rows]
+
+    def predecessors(self):
+        """
+        Predecessor index of the state graph.
+
+        Returns:
+            scipy.sparse.csr_matrix, [S x S] matrix whose row s' has a non-zero entry for every
+            state s from which some action reaches s' with positive probability.
+        """
+        P = self.P.tocoo()
+        mask = P.data > 0
+        pred = sparse.coo_matrix(
+            (np.ones(np.count_nonzero(mask)), (P.col[mask], P.row[mask] // self.nA)), shape=(self.nS, self.nS))
+        return pred.tocsr()
+
+
+def compile_model(env):
+    """
+    Return the TabularModel of env, compiling it on first use.
+
+    Args:
+        env: OpenAI env exposing env.P, env.nS and env.nA, or an already compiled TabularModel.
+
+    Returns:
+        TabularModel of the environment. The compiled model is cached on the env.
+    """
+    if isinstance(env, TabularModel):
+        return env
+    model = getattr(env, '_tabular_model', None)
+    if model is None:
+        # Environments that keep their dynamics in arrays can skip walking env.P
+        model = env.tabular_model() if hasattr(env, 'tabular_model') else TabularModel.from_env(env)
+        env._tabular_model = model
+    return model
+
+
+def absorbing_states(P_pi, r_pi):
+    """
+    Boolean mask of the states a policy never leaves and that yield no reward, i.e.
+    terminal states modelled as self-loops without done. States whose transitions all
+    end the episode need no pinning, their rows of P_pi are empty.
+    """
+    return np.isclose(P_pi.diagonal(), 1.) & (r_pi == 0.)
+
+
+def solve_policy_values(model, policy, discount_factor=1.0, method='auto', V0=None, theta=0.00001):
+    """
+    Evaluate a policy by solving the Bellman equation (I - gamma P_pi) V = r_pi, Eq. (4.4).
+
+    Transitions that end the episode do not bootstrap, and absorbing self-loop states
+    are pinned to V = 0. This keeps the system non-singular for undiscounted episodic
+    tasks as long as the policy ends the episode from every state.
+
+    Args:
+        model: TabularModel of the environment.
+        policy: ndarray, [S x A] matrix representing the policy.
+        discount_factor: float, Gamma discount factor.
+        method: str, 'direct' for a dense solve, 'gmres' or 'bicgstab' for sparse Krylov
+            solvers, or 'auto' to pick 'direct' up to DENSE_SOLVE_MAX_STATES states and 'bicgstab' above.
+        V0: ndarray, optional initial guess for the Krylov solvers (e.g. the previous value function).
+        theta: float, absolute residual tolerance of the Krylov solvers.
+
+    Returns:
+        ndarray, vector of length S representing the value function.
+    """
+    if method == 'auto':
+        method = 'direct' if model.nS <= DENSE_SOLVE_MAX_STATES else 'bicgstab'
+    if method not in ('direct', 'gmres', 'bicgstab'):
+        raise ValueError("method must be one of 'auto', 'direct', 'gmres' or 'bicgstab'")
+
+    P_pi, r_pi = model.policy_model(policy)
+    # Replace the rows of absorbing states by V[s] = 0
+    keep = (~absorbing_states(P_pi, r_pi)).astype(np.float64)
+    A = sparse.identity(model.nS, format='csr') - discount_factor * sparse.diags(keep).dot(P_pi)
+    b = r_pi * keep
+
+    if method == 'direct':
+        return np.linalg.solve(A.toarray(), b)
+
+    solver = splinalg.gmres if method == 'gmres' else splinalg.bicgstab
+    try:
+        V, info = solver(A, b, x0=V0, rtol=0., atol=theta)
+    except TypeError:  # SciPy < 1.12 calls the relative tolerance `tol`
+        V, info = solver(A, b, x0=V0, tol=0., atol=theta)
+    if info != 0:
+        raise RuntimeError('{} did not converge (info={})'.format(method, info))
+    return V
+
+
+def greedy_policy(Q):
+    """
+    Deterministic policy acting greedily with respect to an action-value table.
+
+    Args:
+        Q: ndarray, [S x A] matrix of action values.
+
+    Returns:
+        ndarray, [S x A] one-hot matrix representing the policy.
+    """
+    policy = np.zeros(Q.shape)
+    policy[np.arange(Q.shape[0]), np.argmax(Q, axis=1)] = 1.
+    return policy
+
+
+def max_norm_criterion(theta):
+    """
+    Stop once the value function change is less than theta for all states.
+    """
+    def stop(V, next_v):
+        return np.max(np.abs(next_v - V)) < theta
+    return stop
+
+
+def span_criterion(theta):
+    """
+    Stop once the span seminorm max(next_v - V) - min(next_v - V) is less than theta.
+
+    The span ignores constant shifts of the value function, so it converges before
+    the max-norm when the greedy policy is already settled (e.g. undiscounted problems).
+    """
+    def stop(V, next_v):
+        diff = next_v - V
+        return np.max(diff) - np.min(diff) < theta
+    return stop
+
+
+STOPPING_CRITERIA = {
+    'max_norm': max_norm_criterion,
+    'span': span_criterion,
+}
+
+
+def make_stopping_criterion(stopping, theta):
+    """
+    Resolve a stopping rule for the iterative DP solvers.
+
+    Args:
+        stopping: str, one of 'max_norm' or 'span', a callable stop(V, next_v) -> bool,
+            or None to rely on an iteration budget only.
+        theta: float, tolerance used by the named criteria.
+
+    Returns:
+        A callable stop(V, next_v) -> bool.
+    """
+    if stopping is None:
+        return lambda V, next_v: False
+    if callable(stopping):
+        return stopping
+    if stopping not in STOPPING_CRITERIA:
+        raise ValueError('stopping must be one of {}, a callable or None'.format(sorted(STOPPING_CRITERIA)))
+    return STOPPING_CRITERIA[stopping](theta)
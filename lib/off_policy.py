@@ -0,0 +1,185 @@
+import numpy as np
+
+from lib.episode import EpisodeBuffer
+from lib.tabular import StateIndexer, ValueTable
+
+
+def generate_episodes(env, policy, num_episodes, episodes=None):
+    """
+    Generate episodes with a stochastic policy into one EpisodeBuffer, keeping b(A_t|S_t)
+    of every step for importance sampling.
+
+    Args:
+        env: OpenAI gym environment.
+        policy: A function that given an observation returns a vector of probabilities for each action,
+            or a lib.policies policy object.
+        num_episodes: Number of episodes to sample.
+        episodes: EpisodeBuffer to reuse, it is cleared first.
+
+    Returns:
+        EpisodeBuffer holding the episodes one after another.
+    """
+    if episodes is None:
+        episodes = EpisodeBuffer.for_env(env)
+    episodes.clear()
+    for _ in range(num_episodes):
+        state = env.reset()
+        while True:
+            if hasattr(policy, 'act'):
+                # Policy objects of lib.policies sample directly
+                action = policy.act(state)
+                prob = policy.prob(state, action)
+            else:
+                probs = policy(state)
+                # Inverse CDF sampling, like np.random.choice(len(probs), p=probs) without its checks
+                action = min(int(np.searchsorted(np.cumsum(probs), np.random.rand(), side='right')), len(probs) - 1)
+                prob = probs[action]
+            next_state, reward, done, _ = env.step(action)
+            episodes.append(state, action, reward, done, prob)
+            if done:
+                break
+            state = next_state
+    return episodes
+
+
+def importance_weights(episodes, ratios):
+    """
+    Importance sampling weight W_t = prod_{k=t+1}^{T-1} rho_k of the return following
+    every step, with rho_k = pi(A_k|S_k) / b(A_k|S_k). The action A_t itself is given, so
+    its ratio does not count. A zero ratio truncates the weight of all earlier steps of
+    the episode, like the break of the incremental algorithm.
+
+    Args:
+        episodes: EpisodeBuffer of one or more episodes.
+        ratios: ndarray, importance sampling ratio rho_t of every step.
+
+    Returns:
+        ndarray, weight of every step.
+    """
+    W = np.ones(len(episodes))
+    for steps in episodes.backward_steps():
+        W[steps] = W[steps + 1] * ratios[steps + 1]
+    return W
+
+
+def per_decision_returns(episodes, ratios, discount_factor=1.0):
+    """
+    Per-decision importance sampling returns
+    G_t = R_{t+1} + gamma * rho_{t+1} * G_{t+1}, every reward is only weighted by
+    the ratios of the actions that preceded it (Sutton & Barto, Section 5.9).
+
+    Args:
+        episodes: EpisodeBuffer of one or more episodes.
+        ratios: ndarray, importance sampling ratio rho_t of every step.
+        discount_factor: Gamma discount factor.
+
+    Returns:
+        ndarray, per-decision return of every step.
+    """
+    G = episodes.rewards.copy()
+    for steps in episodes.backward_steps():
+        G[steps] += discount_factor * ratios[steps + 1] * G[steps + 1]
+    return G
+
+
+def _state_action_keys(episodes, indexer, nA):
+    return indexer.index_many(episodes.states) * nA + episodes.actions
+
+
+def off_policy_evaluation(episodes, target_policy, indexer, discount_factor=1.0, per_decision=False):
+    """
+    Every-visit off-policy MC prediction of the action values of a target policy from
+    episodes logged with a behavior policy.
+
+    All ratios, weights and returns are computed as array operations over the whole
+    batch and summed per state-action pair with np.bincount.
+
+    Args:
+        episodes: EpisodeBuffer of one or more episodes, with the behavior probabilities.
+        target_policy: ndarray, [S x A] action probabilities of the target policy, the
+            rows indexed by indexer.
+        indexer: lib.tabular.StateIndexer of the observations.
+        discount_factor: Gamma discount factor.
+        per_decision: Average the per-decision returns (ordinary per-decision importance
+            sampling) instead of weighting the returns (weighted importance sampling).
+
+    Returns:
+        lib.tabular.ValueTable mapping state -> action values like a dict.
+    """
+    nA = target_policy.shape[1]
+    keys = _state_action_keys(episodes, indexer, nA)
+    ratios = target_policy.reshape(-1)[keys] / episodes.behavior_probs
+    size = indexer.nS * nA
+
+    if per_decision:
+        totals = np.bincount(keys, weights=per_decision_returns(episodes, ratios, discount_factor), minlength=size)
+        weights = np.bincount(keys, minlength=size).astype(float)
+    else:
+        W = importance_weights(episodes, ratios)
+        totals = np.bincount(keys, weights=W * episodes.returns(discount_factor), minlength=size)
+        weights = np.bincount(keys, weights=W, minlength=size)
+
+    Q = ValueTable(indexer, nA)
+    Q.values = np.divide(totals, weights, out=np.zeros(size), where=weights > 0).reshape(indexer.nS, nA)
+    Q.visited = np.bincount(keys // nA, minlength=indexer.nS) > 0
+    return Q
+
+
+def off_policy_mc_control(env, num_episodes, behavior_policy, discount_factor=1.0, batch_size=1000):
+    """
+    Monte Carlo Off-Policy Control using Weighted Importance Sampling, with the updates
+    of a batch of episodes applied at once.
+
+    The greedy target policy is fixed during a batch. Its ratios are 1 / b(A_t|S_t) for
+    greedy actions and 0 otherwise, so every step's weight is truncated at the last
+    non-greedy action of its episode. The weighted returns are scatter-added per
+    state-action pair and merged into Q and the cumulative weights C, which gives the
+    same estimate as applying the incremental update step by step against the same target.
+
+    Args:
+        env: OpenAI gym environment.
+        num_episodes: Number of episodes to sample.
+        behavior_policy: The behavior to follow while generating episodes.
+            A function that given an observation returns a vector of probabilities for each action.
+        discount_factor: Gamma discount factor.
+        batch_size: Number of episodes generated between two target policy updates.
+
+    Returns:
+        A tuple (Q, policy).
+        Q is a lib.tabular.ValueTable mapping state -> action values like a dict.
+        policy is a function that takes an observation as an argument and returns
+        action probabilities. This is the optimal greedy policy.
+    """
+    indexer = StateIndexer(env.observation_space)
+    nA = env.action_space.n
+    size = indexer.nS * nA
+    Q = ValueTable(indexer, nA)
+    # Cumulative sum of the importance sampling weights of each state-action pair
+    C = np.zeros(size)
+    episodes = EpisodeBuffer.for_env(env)
+
+    for start in range(0, num_episodes, batch_size):
+        episodes = generate_episodes(env, behavior_policy, min(batch_size, num_episodes - start), episodes)
+        keys = _state_action_keys(episodes, indexer, nA)
+        states = keys // nA
+        # ties are broken consistently, as the target policy has to be deterministic
+        greedy = episodes.actions == np.argmax(Q.values[states], axis=1)
+        ratios = np.where(greedy, 1. / episodes.behavior_probs, 0.)
+
+        W = importance_weights(episodes, ratios)
+        weights = np.bincount(keys, weights=W, minlength=size)
+        totals = np.bincount(keys, weights=W * episodes.returns(discount_factor), minlength=size)
+
+        q = Q.values.reshape(-1)
+        C += weights
+        # weighted importance sampling update, Eq. (5.7) for all returns of the batch at once
+        np.divide(q * (C - weights) + totals, C, out=q, where=C > 0)
+        Q.visited[states] = True
+        print("\rEpisode {}/{}.".format(start + len(episodes.episode_bounds()), num_episodes), end="")
+
+    def policy_fn(state):
+        A = np.zeros(nA)
+        A[np.argmax(Q[state])] = 1.0
+        return A
+
+    return Q, policy_fn
@@ -0,0 +1,164 @@
+import multiprocessing
+import numpy as np
+from multiprocessing import shared_memory
+
+from lib.mdp import TabularModel, compile_model, greedy_policy
+
+# Per-process state of the pool workers, set once by _init_worker
+_worker = {}
+
+
+def _init_worker(P, R, nA, discount_factor, shm_names, nS):
+    _worker['P'], _worker['R'], _worker['nA'] = P, R, nA
+    _worker['discount_factor'] = discount_factor
+    _worker['shm'] = [shared_memory.SharedMemory(name=name) for name in shm_names]
+    _worker['V'] = [np.ndarray((nS,), dtype=np.float64, buffer=shm.buf) for shm in _worker['shm']]
+    _worker['blocks'] = {}
+
+
+def _backup_block(lo, hi, src, in_place):
+    """
+    Bellman optimality backup of the states [lo, hi) reading the shared buffer src.
+    Writes into the same buffer if in_place (Gauss-Seidel and asynchronous), else into
+    the other one (Jacobi).
+
+    Returns:
+        float, max-norm change of the block.
+    """
+    nA = _worker['nA']
+    if (lo, hi) not in _worker['blocks']:
+        _worker['blocks'][(lo, hi)] = (_worker['P'][lo * nA:hi * nA], _worker['R'][lo * nA:hi * nA])
+    P, R = _worker['blocks'][(lo, hi)]
+
+    V = _worker['V'][src]
+    next_v = np.max((R + _worker['discount_factor'] * P.dot(V)).reshape(hi - lo, nA), axis=1)
+    delta = np.max(np.abs(next_v - V[lo:hi])) if hi > lo else 0.
+    dst = V if in_place else _worker['V'][1 - src]
+    dst[lo:hi] = next_v
+    return delta
+
+
+def _block_colors(model, bounds):
+    """
+    Greedy colouring of the state blocks such that no two blocks of the same colour read
+    each other's states, i.e. no state of one has a successor in the other.
+
+    Returns:
+        list of lists of block indices, one list per colour in the order of their first block.
+    """
+    P = model.P.tocoo()
+    block_of = lambda states: np.searchsorted(bounds, states, side='right') - 1
+    src, dst = block_of(P.row // model.nA), block_of(P.col)
+    neighbours = [set() for _ in range(len(bounds) - 1)]
+    for i, j in set(zip(src[src != dst].tolist(), dst[src != dst].tolist())):
+        neighbours[i].add(j)
+        neighbours[j].add(i)
+
+    colors = []
+    for block, adjacent in enumerate(neighbours):
+        for color in colors:
+            if not adjacent.intersection(color):
+                color.append(block)
+                break
+        else:
+            colors.append([block])
+    return colors
+
+
+def _parallel_sweeps(model, theta, discount_factor, processes, mode, num_blocks):
+    if mode not in ('jacobi', 'gauss_seidel', 'asynchronous'):
+        raise ValueError("mode must be 'jacobi', 'gauss_seidel' or 'asynchronous'")
+    processes = processes or multiprocessing.cpu_count()
+    # Gauss-Seidel only runs the blocks of one colour at a time, typically half of them
+    num_blocks = num_blocks or (2 * processes if mode == 'gauss_seidel' else processes)
+    bounds = np.linspace(0, model.nS, num_blocks + 1).astype(int)
+    blocks = list(zip(bounds[:-1], bounds[1:]))
+    in_place = mode != 'jacobi'
+    if mode == 'gauss_seidel':
+        phases = [[blocks[i] for i in color] for color in _block_colors(model, bounds)]
+
+    # Two value function buffers, Jacobi sweeps read one and write the other
+    shms = [shared_memory.SharedMemory(create=True, size=max(1, model.nS) * 8) for _ in range(2)]
+    try:
+        for shm in shms:
+            np.ndarray((model.nS,), dtype=np.float64, buffer=shm.buf)[:] = 0.
+        src = 0
+        initargs = (model.P, model.R, model.nA, discount_factor, [shm.name for shm in shms], model.nS)
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+            while True:
+                if mode == 'gauss_seidel':
+                    # The blocks of a colour run concurrently, they never read each other's states,
+                    # and every colour reads the values the previous colours wrote this sweep
+                    deltas = []
+                    for phase in phases:
+                        deltas += pool.starmap(_backup_block, [(lo, hi, src, True) for lo, hi in phase])
+                else:
+                    deltas = pool.starmap(_backup_block, [(lo, hi, src, in_place) for lo, hi in blocks])
+                if not in_place:
+                    src = 1 - src
+                if max(deltas) < theta:
+                    break
+        return np.ndarray((model.nS,), dtype=np.float64, buffer=shms[src].buf).copy()
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+
+def parallel_value_iteration(env, theta=0.0001, discount_factor=1.0, processes=None, mode='jacobi',
+                             num_blocks=None):
+    """
+    Value Iteration with the state space split into blocks that are backed up by a process pool.
+
+    The value function lives in multiprocessing.shared_memory (Python 3.8+), so workers only
+    exchange block bounds and residuals with the parent. 'jacobi' sweeps read the previous
+    value function only and produce the same iterates as the serial value_iteration.
+    'gauss_seidel' colours the blocks so that blocks of the same colour never read each
+    other's states, e.g. red/black alternating row bands of a grid, and backs up one colour
+    at a time in place, its blocks concurrently. Every block sees the values the previous
+    colours wrote in the same sweep, so it needs fewer sweeps than 'jacobi' and is still
+    deterministic. With dense dynamics every block reads every other one and the colours
+    degenerate to one block each, use 'jacobi' there.
+    'asynchronous' dispatches all blocks at once and updates in place, every block reads
+    whatever values the other workers have written so far (chaotic relaxation). It
+    converges to the same fixed point, but the iterates and the number of sweeps vary
+    from run to run.
+
+    Args:
+        env: OpenAI env, or a compiled lib.mdp.TabularModel.
+        theta: We stop once the value function change is less than theta for all states.
+        discount_factor: Gamma discount factor.
+        processes: Number of worker processes (default: number of cores).
+        mode: 'jacobi', 'gauss_seidel' or 'asynchronous'.
+        num_blocks: Number of state blocks per sweep (default: one per process, two per process for 'gauss_seidel').
+
+    Returns:
+        A tuple (policy, V) of the optimal policy and the optimal value function.
+    """
+    model = compile_model(env)
+    V = _parallel_sweeps(model, theta, discount_factor, processes, mode, num_blocks)
+    return greedy_policy(model.q_values(V, discount_factor)), V
+
+
+def parallel_policy_eval(policy, env, discount_factor=1.0, theta=0.00001, processes=None, mode='jacobi',
+                         num_blocks=None):
+    """
+    Policy Evaluation with the state space split into blocks that are backed up by a process pool.
+    See parallel_value_iteration for the synchronization modes.
+
+    Args:
+        policy: ndarray, [S x A] matrix representing the policy.
+        env: OpenAI env, or a compiled lib.mdp.TabularModel.
+        discount_factor: float, Gamma discount factor.
+        theta: float, we stop evaluation once our value function change is less than theta for all states.
+        processes: Number of worker processes (default: number of cores).
+        mode: 'jacobi', 'gauss_seidel' or 'asynchronous'.
+        num_blocks: Number of state blocks per sweep (default: one per process, two per process for 'gauss_seidel').
+
+    Returns: ndarray, vector of length env.nS representing the value function.
+    """
+    model = compile_model(env)
+    # Evaluating a policy is value iteration on the single-action MDP induced by the policy
+    P_pi, r_pi = model.policy_model(policy)
+    return _parallel_sweeps(TabularModel(model.nS, 1, P_pi, r_pi), theta, discount_factor, processes, mode,
+                            num_blocks)
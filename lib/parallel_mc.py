@@ -0,0 +1,199 @@
+import multiprocessing
+import numpy as np
+from gym.utils import seeding
+
+from lib.episode import EpisodeBuffer
+from lib.tabular import StateIndexer, ValueTable
+from lib.utils import randargmax
+
+# Per-process state of the pool workers, set once by _init_worker
+_worker = {}
+
+
+class ReturnStats(object):
+    """
+    Sufficient statistics of first-visit Monte Carlo: the sum and the number of the
+    first-visit returns of every key (a state index, or state_index * nA + action).
+
+    Statistics of disjoint sets of episodes merge by addition, so workers can
+    collect them independently and the parent combines them in a fixed order.
+    """
+
+    def __init__(self, size):
+        self.returns_sum = np.zeros(size)
+        self.counts = np.zeros(size)
+
+    def add_episode(self, keys, G):
+        """
+        Args:
+            keys: ndarray, key of every time step of the episode.
+            G: ndarray, return following every time step.
+        """
+        _, first_visits = np.unique(keys, return_index=True)
+        visited = keys[first_visits]
+        self.returns_sum[visited] += G[first_visits]
+        self.counts[visited] += 1
+
+    def merge(self, other):
+        self.returns_sum += other.returns_sum
+        self.counts += other.counts
+        return self
+
+    def means(self):
+        return np.divide(self.returns_sum, self.counts, out=np.zeros(len(self.counts)), where=self.counts > 0)
+
+
+def _init_worker(env, policy, discount_factor, epsilon):
+    _worker['env'], _worker['policy'] = env, policy
+    _worker['discount_factor'], _worker['epsilon'] = discount_factor, epsilon
+    _worker['indexer'] = StateIndexer(env.observation_space)
+    _worker['episode'] = EpisodeBuffer.for_env(env)
+
+
+def _epsilon_greedy_action(q, epsilon, np_random):
+    if np_random.rand() < epsilon:
+        return np_random.randint(len(q))
+    # Break ties between greedy actions at random
+    return randargmax(q, np_random)
+
+
+def _run_chunk(seeds, num_episodes, Q):
+    """
+    Generate num_episodes episodes and collect their first-visit return statistics.
+
+    Args:
+        seeds: pair of seeds, for the environment and for the action selection.
+        num_episodes: Number of episodes to sample.
+        Q: ndarray, [S x A] snapshot of the action values to follow epsilon-greedily,
+            or None to follow the fixed policy given to the pool.
+
+    Returns:
+        ReturnStats over state indices (prediction) or state-action keys (control).
+    """
+    env, episode, indexer = _worker['env'], _worker['episode'], _worker['indexer']
+    env.np_random, _ = seeding.np_random(int(seeds[0]))
+    np_random, _ = seeding.np_random(int(seeds[1]))
+    policy, epsilon = _worker['policy'], _worker['epsilon']
+    nA = env.action_space.n
+    stats = ReturnStats(indexer.nS if Q is None else indexer.nS * nA)
+
+    for _ in range(num_episodes):
+        episode.clear()
+        state = env.reset()
+        while True:
+            if Q is None:
+                action = policy(state)
+            else:
+                action = _epsilon_greedy_action(Q[indexer.index(state)], epsilon, np_random)
+            next_state, reward, done, _ = env.step(action)
+            episode.append(state, action, reward, done)
+            if done:
+                break
+            state = next_state
+
+        states = indexer.index_many(episode.states)
+        keys = states if Q is None else states * nA + episode.actions
+        stats.add_episode(keys, episode.returns(_worker['discount_factor']))
+    return stats
+
+
+def _chunk_sizes(num_episodes, chunk_size):
+    sizes = [chunk_size] * (num_episodes // chunk_size)
+    if num_episodes % chunk_size:
+        sizes.append(num_episodes % chunk_size)
+    return sizes
+
+
+def parallel_mc_prediction(policy, env, num_episodes, discount_factor=1.0, seed=None, processes=None,
+                           chunk_size=1000):
+    """
+    First-visit Monte Carlo prediction with the episodes split into chunks that are
+    generated by a process pool.
+
+    Every chunk seeds the environment with its own seeding.np_random stream derived from
+    the master seed, so the result only depends on seed and chunk_size, not on the
+    number of processes.
+
+    Args:
+        policy: A function that maps an observation to an action. It must be picklable,
+            i.e. a module-level function, and deterministic for the result to be reproducible.
+        env: OpenAI gym environment.
+        num_episodes: Number of episodes to sample.
+        discount_factor: float, gamma discount factor.
+        seed: int, master seed (default: random).
+        processes: Number of worker processes (default: number of cores).
+        chunk_size: Number of episodes of every task sent to a worker.
+
+    Returns:
+        lib.tabular.ValueTable, maps from state -> value like a dict.
+    """
+    master, _ = seeding.np_random(seed)
+    sizes = _chunk_sizes(num_episodes, chunk_size)
+    seeds = master.randint(2 ** 31 - 1, size=(len(sizes), 2))
+
+    stats = ReturnStats(StateIndexer(env.observation_space).nS)
+    processes = processes or multiprocessing.cpu_count()
+    with multiprocessing.Pool(processes, initializer=_init_worker,
+                              initargs=(env, policy, discount_factor, 0.)) as pool:
+        for chunk_stats in pool.starmap(_run_chunk, [(s, n, None) for s, n in zip(seeds, sizes)]):
+            stats.merge(chunk_stats)
+
+    V = ValueTable(StateIndexer(env.observation_space))
+    V.values = stats.means()
+    V.visited = stats.counts > 0
+    return V
+
+
+def parallel_mc_control_epsilon_greedy(env, num_episodes, discount_factor=1.0, epsilon=0.1, seed=None,
+                                       processes=None, chunk_size=1000, sync_every=10000):
+    """
+    Monte Carlo Control using Epsilon-Greedy policies, with the episodes generated by a process pool.
+
+    Episodes are generated in rounds of sync_every episodes. During a round the workers
+    follow the epsilon-greedy policy of the same Q snapshot and send back the return
+    statistics of their chunks. The parent merges them in chunk order and averages all
+    returns seen so far into the snapshot of the next round. The serial
+    mc_control_epsilon_greedy is the special case of one episode per round.
+
+    Args:
+        env: OpenAI gym environment.
+        num_episodes: Number of episodes to sample.
+        discount_factor: Gamma discount factor.
+        epsilon: Chance the sample a random action. Float betwen 0 and 1.
+        seed: int, master seed (default: random). The result only depends on seed,
+            chunk_size and sync_every, not on the number of processes.
+        processes: Number of worker processes (default: number of cores).
+        chunk_size: Number of episodes of every task sent to a worker.
+        sync_every: Number of episodes between two Q snapshots.
+
+    Returns:
+        A tuple (Q, policy).
+        Q is a lib.tabular.ValueTable mapping state -> action values like a dict.
+        policy is a function that takes an observation as an argument and returns
+        action probabilities
+    """
+    master, _ = seeding.np_random(seed)
+    indexer = StateIndexer(env.observation_space)
+    nA = env.action_space.n
+    stats = ReturnStats(indexer.nS * nA)
+    Q = ValueTable(indexer, nA)
+
+    processes = processes or multiprocessing.cpu_count()
+    with multiprocessing.Pool(processes, initializer=_init_worker,
+                              initargs=(env, None, discount_factor, epsilon)) as pool:
+        for round_start in range(0, num_episodes, sync_every):
+            sizes = _chunk_sizes(min(sync_every, num_episodes - round_start), chunk_size)
+            seeds = master.randint(2 ** 31 - 1, size=(len(sizes), 2))
+            for chunk_stats in pool.starmap(_run_chunk, [(s, n, Q.values) for s, n in zip(seeds, sizes)]):
+                stats.merge(chunk_stats)
+            Q.values = stats.means().reshape(indexer.nS, nA)
+            print("\rEpisode {}/{}.".format(round_start + sum(sizes), num_episodes), end="")
+
+    Q.visited = stats.counts.reshape(indexer.nS, nA).any(axis=1)
+
+    def policy_fn(state):
+        A = np.ones(nA) * epsilon / nA
+        A[np.argmax(Q[state])] += (1.0 - epsilon)
+        return A
+
+    return Q, policy_fn
@@ -1,12 +1,11 @@
 import matplotlib
 import numpy as np
+import time
 import pandas as pd
-from collections import namedtuple
+import matplotlib.gridspec as gridspec
 from matplotlib import pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
-
-EpisodeStats = namedtuple("Stats",["episode_lengths", "episode_rewards"])
-TimestepStats = namedtuple("Stats",["cumulative_rewards", "regrets"])
+from lib.stats import EpisodeStats, TimestepStats, BatchTimestepStats
 
 def plot_cost_to_go_mountain_car(env, estimator, num_tiles=20):
     x = np.linspace(env.observation_space.low[0], env.observation_space.high[0], num=num_tiles)
@@ -40,8 +39,13 @@ def plot_value_function(V, title="Value Function"):
     X, Y = np.meshgrid(x_range, y_range)
 
     # Find value for all (x, y) coordinates
-    Z_noace = np.apply_along_axis(lambda _: V[(_[0], _[1], False)], 2, np.dstack([X, Y]))
-    Z_ace = np.apply_along_axis(lambda _: V[(_[0], _[1], True)], 2, np.dstack([X, Y]))
+    if hasattr(V, 'lookup'):
+        # Dense tables (lib.tabular.ValueTable) read the whole grid at once
+        Z_noace = V.lookup(np.dstack([X, Y, np.zeros_like(X)]))
+        Z_ace = V.lookup(np.dstack([X, Y, np.ones_like(X)]))
+    else:
+        Z_noace = np.apply_along_axis(lambda _: V[(_[0], _[1], False)], 2, np.dstack([X, Y]))
+        Z_ace = np.apply_along_axis(lambda _: V[(_[0], _[1], True)], 2, np.dstack([X, Y]))
 
     def plot_surface(X, Y, Z, title):
         fig = plt.figure(figsize=(20, 10))
@@ -141,4 +145,172 @@ def plot_reward_regret(stats, smoothing_window=1, hideplot=False):
     else:
         plt.show(fig2)
              
-    return fig1, fig2
\ No newline at end of file
+    return fig1, fig2
+
+def plot_regret_band(stats, hideplot=False):
+    # Plot the mean regret over time with its confidence band across runs
+    fig1 = plt.figure(figsize=(10,5))
+    x = np.arange(len(stats.regrets))
+    plt.fill_between(x, stats.regrets_lower, stats.regrets_upper, alpha=0.3)
+    plt.plot(x, stats.regrets)
+    plt.xlabel("Timestep")
+    plt.ylabel("Regret")
+    plt.title("Mean Regret over Timestep with Confidence Band")
+    if hideplot:
+        plt.close(fig1)
+    else:
+        plt.show()
+
+    return fig1
+
+
+def decimate_minmax(y, max_points):
+    """
+    Downsample a long curve for display, keeping the minimum and the maximum of every
+    bucket of consecutive points in their original order, so spikes stay visible.
+
+    Args:
+        y (ndarray): Values of the curve, plotted against their indices.
+        max_points (int): Upper bound on the number of points returned, at least 2.
+
+    Returns:
+        A tuple (x, y) of the indices and values of the kept points.
+    """
+    if max_points < 2:
+        raise ValueError('max_points must be at least 2, got {}'.format(max_points))
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n), y
+    size = -(-n // (max_points // 2))
+    buckets = np.pad(y, (0, -n % size), mode='edge').reshape(-1, size)
+    starts = np.arange(len(buckets)) * size
+    lo = starts + np.argmin(buckets, axis=1)
+    hi = starts + np.argmax(buckets, axis=1)
+    # Emit the extrema of every bucket in the order they occur
+    x = np.stack([np.minimum(lo, hi), np.maximum(lo, hi)], axis=1).reshape(-1)
+    x = np.minimum(x, n - 1)
+    return x, y[x]
+
+
+class ExperimentDisplay(object):
+    """
+    Display sink of a lib.simulation.Experiment: the live figure of an environment with
+    its episode lengths and rewards, and the end-of-run plots.
+
+    Live updates are rate limited to max_fps redraws per second, updates in between are
+    dropped without rendering the environment. Steps and episodes have separate rate
+    limits, so the blits of the environment image never starve the curves. The environment image is blitted onto a
+    cached background instead of redrawing the whole canvas, where the backend supports
+    it, and the length and reward curves are min/max decimated to max_points points.
+    """
+
+    plot_action_rewards = staticmethod(plot_action_rewards)
+    plot_reward_regret = staticmethod(plot_reward_regret)
+    plot_regret_band = staticmethod(plot_regret_band)
+    plot_episode_stats = staticmethod(plot_episode_stats)
+
+    def __init__(self, env, max_fps=10, max_points=2000):
+        if max_points < 2:
+            raise ValueError('max_points must be at least 2, got {}'.format(max_points))
+        self.env = env
+        self.min_interval = 1. / max_fps if max_fps else 0.
+        self.max_points = max_points
+        # Time of the last environment blit and of the last curve redraw
+        self._last_draw = {'step': -np.inf, 'episode': -np.inf}
+        self._background = None
+        self.fig = plt.figure(figsize=(10, 5))
+        gs = gridspec.GridSpec(2, 2)
+        self.ax = plt.subplot(gs[:, 0])
+        self.ax.xaxis.set_visible(False)
+        self.ax.yaxis.set_visible(False)
+
+        if hasattr(self.env, '_cliff'): # Hardcode to nicely display grid for cliffwalkingenv
+            self.ax.xaxis.set_visible(True)
+            self.ax.yaxis.set_visible(True)
+            self.ax.set_xticks(np.arange(-.5, 12, 1), minor=True);
+            self.ax.set_yticks(np.arange(-.5, 4, 1), minor=True);
+            self.ax.grid(which='minor', color='w', linestyle='-', linewidth=1)
+
+        if hasattr(self.env, 'winds'): # Hardcode to nicely display grid for windygridworldenv
+            self.ax.xaxis.set_visible(True)
+            self.ax.yaxis.set_visible(True)
+            self.ax.set_xticks(np.arange(-.5, 10, 1), minor=True);
+            self.ax.set_yticks(np.arange(-.5, 7, 1), minor=True);
+            self.ax.grid(which='minor', color='w', linestyle='-', linewidth=1)
+
+        self.ax1 = plt.subplot(gs[0, 1])
+        self.ax1.yaxis.set_label_position("right")
+        self.ax1.set_ylabel('Length')
+        self.ax1.set_xlim(0, 10)
+        self.ax1.set_ylim(0, 51)
+
+        self.ax2 = plt.subplot(gs[1, 1])
+        self.ax2.set_xlabel('Episode')
+        self.ax2.yaxis.set_label_position("right")
+        self.ax2.set_ylabel('Reward')
+        self.ax2.set_xlim(0, 10)
+        self.ax2.set_ylim(0, 2)
+
+        self.line, = self.ax1.plot([], [])
+        self.line2, = self.ax2.plot([], [])
+
+    def clear(self):
+        self.fig.clf()
+        self._background = None
+
+    def _due(self, kind, force=False):
+        return force or time.perf_counter() - self._last_draw[kind] >= self.min_interval
+
+    def _drawn(self, kind):
+        # Count the interval from the end of the redraw, so slow redraws cannot take all the time
+        self._last_draw[kind] = time.perf_counter()
+
+    def _draw(self):
+        # Full redraw, the animated environment image is blitted on top of the new background
+        self.fig.canvas.draw()
+        self._background = None
+        if hasattr(self, 'imgplot'):
+            self._blit_image()
+
+    def _blit_image(self):
+        canvas = self.fig.canvas
+        if not getattr(canvas, 'supports_blit', False):
+            self.ax.draw_artist(self.imgplot)
+            canvas.draw_idle()
+            return
+        if self._background is None:
+            self._background = canvas.copy_from_bbox(self.ax.bbox)
+        else:
+            canvas.restore_region(self._background)
+        self.ax.draw_artist(self.imgplot)
+        canvas.blit(self.ax.bbox)
+        canvas.flush_events()
+
+    def update_step(self, force=False):
+        if not self._due('step', force):
+            return
+        if not hasattr(self, 'imgplot'):
+            self.imgplot = self.ax.imshow(self.env.render(mode='rgb_array'), interpolation='none', cmap='viridis',
+                                          animated=True)
+            self._draw()
+        else:
+            self.imgplot.set_data(self.env.render(mode='rgb_array'))
+            self._blit_image()
+        self._drawn('step')
+
+    def update_episode(self, episode_lengths, episode_rewards, force=False):
+        if len(episode_lengths) == 0 or not self._due('episode', force):
+            return
+        n = len(episode_lengths)
+        x, lengths = decimate_minmax(episode_lengths, self.max_points)
+        self.line.set_data(x, lengths)
+        self.ax1.set_xlim(0, max(10, n+1))
+        self.ax1.set_ylim(0, lengths.max()+1)
+
+        x, rewards = decimate_minmax(episode_rewards, self.max_points)
+        self.line2.set_data(x, rewards)
+        self.ax2.set_xlim(0, max(10, n+1))
+        self.ax2.set_ylim(rewards.min()-1, rewards.max()+1)
+
+        self._draw()
+        self._drawn('episode')
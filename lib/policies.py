@@ -0,0 +1,93 @@
+import numpy as np
+
+from lib.utils import randargmax, randargmax_rows
+
+
+class GreedyPolicy(object):
+    """
+    Greedy policy over a lib.tabular.ValueTable of action values that samples actions directly.
+
+    The greedy action of every state is cached in the array greedy, ties broken at random
+    when it is computed. Call refresh(states) after updating the action values of
+    states. act() returns an action without building a probability vector, probs() builds
+    one only where it is needed, e.g. for importance sampling. Calling the policy
+    returns probs(state), like the policy functions of the Monte Carlo scripts.
+
+    act() also accepts a whole batch of observations as an ndarray, [N] for Discrete and
+    [N x k] for Tuple spaces, e.g. the observations of a vectorized environment.
+    """
+
+    def __init__(self, Q, np_random=np.random):
+        self.Q = Q
+        self.nA = Q.nA
+        self.indexer = Q.indexer
+        self.np_random = np_random
+        self._batch_ndim = 2 if Q.indexer.is_tuple else 1
+        self.greedy = randargmax_rows(Q.values, np_random)
+
+    def refresh(self, states=None):
+        """
+        Recompute the cached greedy actions of the state indices states (default: all states).
+        """
+        if states is None:
+            self.greedy = randargmax_rows(self.Q.values, self.np_random)
+        elif len(states) <= 8:
+            # The few states of one episode are faster to refresh one by one
+            for s in states:
+                self.greedy[s] = randargmax(self.Q.values[s], self.np_random)
+        else:
+            self.greedy[states] = randargmax_rows(self.Q.values[states], self.np_random)
+
+    def _is_batch(self, state):
+        return isinstance(state, np.ndarray) and state.ndim == self._batch_ndim
+
+    def act(self, state):
+        if self._is_batch(state):
+            return self.greedy[self.indexer.index_many(state)]
+        return int(self.greedy[self.indexer.index(state)])
+
+    def prob(self, state, action):
+        """
+        Probability pi(action|state).
+        """
+        return float(action == self.greedy[self.indexer.index(state)])
+
+    def probs(self, state):
+        A = np.zeros(self.nA)
+        A[self.greedy[self.indexer.index(state)]] = 1.
+        return A
+
+    def __call__(self, state):
+        return self.probs(state)
+
+
+class EpsilonGreedyPolicy(GreedyPolicy):
+    """
+    Epsilon-greedy version of GreedyPolicy: act() draws a single uniform number, compared
+    with epsilon, and falls back on the cached greedy action.
+    """
+
+    def __init__(self, Q, epsilon, np_random=np.random):
+        if epsilon is None or epsilon < 0 or epsilon > 1:
+            raise ValueError("EpsilonGreedyPolicy: Invalid value of epsilon")
+        GreedyPolicy.__init__(self, Q, np_random)
+        self.epsilon = epsilon
+
+    def act(self, state):
+        if self._is_batch(state):
+            actions = self.greedy[self.indexer.index_many(state)]
+            explore = self.np_random.rand(len(actions)) < self.epsilon
+            actions[explore] = self.np_random.randint(self.nA, size=np.count_nonzero(explore))
+            return actions
+        if self.np_random.rand() < self.epsilon:
+            return self.np_random.randint(self.nA)
+        return int(self.greedy[self.indexer.index(state)])
+
+    def prob(self, state, action):
+        # Account that optimal action can be selected randomly
+        return self.epsilon / self.nA + (1. - self.epsilon) * GreedyPolicy.prob(self, state, action)
+
+    def probs(self, state):
+        A = np.full(self.nA, self.epsilon / self.nA)
+        A[self.greedy[self.indexer.index(state)]] += 1. - self.epsilon
+        return A
@@ -1,90 +1,93 @@
 import numpy as np
-import sys
-import lib.plotting as plotting
-from matplotlib import pyplot as plt
-from matplotlib import pylab
-import matplotlib.gridspec as gridspec
+from statistics import NormalDist
+from lib.stats import EpisodeStatsCollector, EpisodeStats, TimestepStats, BatchTimestepStats
+
+# Agent protocols of Experiment.run, see its docstring
+ACT_ONLY = 'act_only'
+OFF_POLICY = 'off_policy'
+ON_POLICY = 'on_policy'
+PROTOCOLS = (ACT_ONLY, OFF_POLICY, ON_POLICY)
 
 class Experiment(object):
-    def __init__(self, env, agent):
+    """
+    Runs an agent on an environment and records its statistics.
+
+    Displaying is an optional sink: unless headless, an ExperimentDisplay from lib.plotting
+    is attached, which is the only place matplotlib gets imported. Headless experiments
+    never import matplotlib, print nothing and just return their stats, so they are cheap
+    to create in worker processes. An Experiment pickles without its display, e.g. to
+    send it to a process pool, and arrives there headless.
+    """
+    def __init__(self, env, agent, max_history=None, headless=False):
         
         self.env = env
         self.agent = agent
+        self.headless = headless
         
-        self.episode_length = np.array([0])
-        self.episode_reward = np.array([0])
-        
-        self.fig = pylab.figure(figsize=(10, 5))
-        gs = gridspec.GridSpec(2, 2)
-        self.ax = pylab.subplot(gs[:, 0])
-        self.ax.xaxis.set_visible(False)
-        self.ax.yaxis.set_visible(False)
-        
-        if hasattr(self.env, '_cliff'): # Hardcode to nicely display grid for cliffwalkingenv
-            self.ax.xaxis.set_visible(True)
-            self.ax.yaxis.set_visible(True)
-            self.ax.set_xticks(np.arange(-.5, 12, 1), minor=True);
-            self.ax.set_yticks(np.arange(-.5, 4, 1), minor=True);
-            self.ax.grid(which='minor', color='w', linestyle='-', linewidth=1)
-            
-        if hasattr(self.env, 'winds'): # Hardcode to nicely display grid for windygridworldenv
-            self.ax.xaxis.set_visible(True)
-            self.ax.yaxis.set_visible(True)
-            self.ax.set_xticks(np.arange(-.5, 10, 1), minor=True);
-            self.ax.set_yticks(np.arange(-.5, 7, 1), minor=True);
-            self.ax.grid(which='minor', color='w', linestyle='-', linewidth=1)
-        
-        self.ax1 = pylab.subplot(gs[0, 1])
-        self.ax1.yaxis.set_label_position("right")
-        self.ax1.set_ylabel('Length')
+        # Streaming episode statistics, keeps only the last max_history episodes if given
+        self.stats = EpisodeStatsCollector(max_history=max_history)
         
-        self.ax1.set_xlim(0, max(10, len(self.episode_length)+1))
-        self.ax1.set_ylim(0, 51)
+        # Callbacks of run(), see add_step_hook and add_episode_hook
+        self.step_hooks = []
+        self.episode_hooks = []
         
-        self.ax2 = pylab.subplot(gs[1, 1])
-        self.ax2.set_xlabel('Episode')
-        self.ax2.yaxis.set_label_position("right")
-        self.ax2.set_ylabel('Reward')
-        self.ax2.set_xlim(0, max(10, len(self.episode_reward)+1))
-        self.ax2.set_ylim(0, 2)
+        self.display = None
+        if not headless:
+            self.attach_display()
         
-        self.line, = self.ax1.plot(range(len(self.episode_length)),self.episode_length)
-        self.line2, = self.ax2.plot(range(len(self.episode_reward)),self.episode_reward)
-        
-    def update_display_step(self):
-        if not hasattr(self, 'imgplot'):
-            self.imgplot = self.ax.imshow(self.env.render(mode='rgb_array'), interpolation='none', cmap='viridis')
-        else:
-            self.imgplot.set_data(self.env.render(mode='rgb_array'))
+    def attach_display(self, max_fps=10, max_points=2000):
+        """
+        Attach an ExperimentDisplay that redraws at most max_fps times per second and
+        plots at most max_points points of the episode curves.
+        """
+        # Imported on demand, so that headless experiments never load matplotlib
+        from lib.plotting import ExperimentDisplay
+        self.display = ExperimentDisplay(self.env, max_fps, max_points)
+        self.headless = False
+        return self.display
     
-        self.fig.canvas.draw()
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['display'] = None
+        state['headless'] = True
+        return state
         
-    def update_display_episode(self):  
-        self.line.set_data(range(len(self.episode_length)),self.episode_length)
-        self.ax1.set_xlim(0, max(10, len(self.episode_length)+1))
-        self.ax1.set_ylim(0, max(self.episode_length)+1)
+    @property
+    def episode_length(self):
+        return self.stats.episode_lengths
+    
+    @property
+    def episode_reward(self):
+        return self.stats.episode_rewards
+    
+    def update_display_step(self):
+        if self.display is not None:
+            self.display.update_step()
         
-        self.line2.set_data(range(len(self.episode_reward)),self.episode_reward)
-        self.ax2.set_xlim(0, max(10, len(self.episode_reward)+1))
-        self.ax2.set_ylim(min(self.episode_reward)-1, max(self.episode_reward)+1)
+    def update_display_episode(self, force=False):  
+        if self.display is not None:
+            self.display.update_episode(self.episode_length, self.episode_reward, force)
         
-        self.fig.canvas.draw()     
+    def _check_interactive(self, interactive):
+        if interactive and self.display is None:
+            raise ValueError("Interactive runs need a display, call attach_display() first")
         
     def run_bandit(self, max_number_of_trials=1000, display_frequency=1):
-        self.fig.clf()
+        if self.display is not None:
+            self.display.clear()
         
-        if self.env.distribution != 'normal':
-            print("Distribution:", self.env.distribution, self.env.reward_parameters, flush = True)
-        else:
-            print("Distribution:", self.env.distribution, self.env.reward_parameters[0], flush = True)
-        print("Optimal action:", self.env.optimal_arm, flush = True)
+            if self.env.distribution != 'normal':
+                print("Distribution:", self.env.distribution, self.env.reward_parameters, flush = True)
+            else:
+                print("Distribution:", self.env.distribution, self.env.reward_parameters[0], flush = True)
+            print("Optimal action:", self.env.optimal_arm, flush = True)
         
-        if self.env.distribution != "normal":
-            plotting.plot_action_rewards(self.env.reward_parameters)
-        else:
-            plotting.plot_action_rewards(self.env.reward_parameters[0])
+            if self.env.distribution != "normal":
+                self.display.plot_action_rewards(self.env.reward_parameters)
+            else:
+                self.display.plot_action_rewards(self.env.reward_parameters[0])
         
-        stats = plotting.TimestepStats(
+        stats = TimestepStats(
             cumulative_rewards=np.zeros(max_number_of_trials),
             regrets=np.zeros(max_number_of_trials))   
             
@@ -104,165 +107,182 @@ class Experiment(object):
             stats.cumulative_rewards[trial] = cumulative_reward
             stats.regrets[trial] = cumulative_regret
 
-        print("--------------------------------------------------", flush = True)
-        print("Policy:", self.agent.name, "\nAverage Reward:", cumulative_reward / max_number_of_trials, \
-                "\nAverage Regret:", cumulative_regret / max_number_of_trials, flush = True)
-        print("Arm pulls:", self.agent.total_counts, flush = True)
+        if self.display is not None:
+            print("--------------------------------------------------", flush = True)
+            print("Policy:", self.agent.name, "\nAverage Reward:", cumulative_reward / max_number_of_trials, \
+                    "\nAverage Regret:", cumulative_regret / max_number_of_trials, flush = True)
+            print("Arm pulls:", self.agent.total_counts, flush = True)
          
-        plotting.plot_reward_regret(stats)
+            self.display.plot_reward_regret(stats)
+        return stats
         
-    def run_agent(self, max_number_of_episodes=100, interactive = False, display_frequency=1):
+    def run_bandit_batch(self, max_number_of_trials=1000, confidence=0.95):
+        """
+        Run a batch agent on a BatchBanditEnv, i.e. env.num_runs independent bandit runs at once.
 
-        # repeat for each episode
-        for episode_number in range(max_number_of_episodes):
-            
-            # initialize state
-            state = self.env.reset()
-            
-            done = False # used to indicate terminal state
-            R = 0 # used to display accumulated rewards for an episode
-            t = 0 # used to display accumulated steps for an episode i.e episode length
-            
-            # repeat for each step of episode, until state is terminal
-            while not done:
-                
-                # increase step counter - for display
-                t += 1
-                
-                # choose action from state 
-                action = self.agent.act(state)
-                
-                # take action, observe reward and next state
-                next_state, reward, done, _ = self.env.step(action)
-                
-                # state <- next state
-                state = next_state
-                
-                R += reward # accumulate reward - for display
-                
-                # if interactive display, show update for each step
-                if interactive:
-                    self.update_display_step()
-            
-            self.episode_length = np.append(self.episode_length,t) # keep episode length - for display
-            self.episode_reward = np.append(self.episode_reward,R) # keep episode reward - for display 
-            
-            # if interactive display, show update for the episode
-            if interactive:
-                self.update_display_episode()
-        
-        # if not interactive display, show graph at the end
-        if not interactive:
-            self.fig.clf()
-            stats = plotting.EpisodeStats(
-                episode_lengths=self.episode_length,
-                episode_rewards=self.episode_reward,
-                episode_running_variance=np.zeros(max_number_of_episodes))
-            plotting.plot_episode_stats(stats, display_frequency)
-        
-  
-    def run_qlearning(self, max_number_of_episodes=100, interactive = False, display_frequency=1):
+        The agent's act() returns one action per run and feedback(actions, rewards) takes
+        vectors of length env.num_runs. Only the mean and spread of the cumulative regret
+        across runs are kept per trial, so memory does not grow with the number of runs.
+
+        Returns:
+            BatchTimestepStats with the mean cumulative reward and regret per trial,
+            and the normal-approximation confidence band of the mean regret.
+        """
+        num_runs = self.env.num_runs
+        z = NormalDist().inv_cdf(0.5 + confidence / 2.)
+        if self.display is not None:
+            self.display.clear()
+            print("Distribution:", self.env.distribution, "over", num_runs, "runs", flush = True)
+
+        stats = BatchTimestepStats(
+            cumulative_rewards=np.zeros(max_number_of_trials),
+            regrets=np.zeros(max_number_of_trials),
+            regrets_lower=np.zeros(max_number_of_trials),
+            regrets_upper=np.zeros(max_number_of_trials))
+
+        cumulative_reward = np.zeros(num_runs)
+        cumulative_regret = np.zeros(num_runs)
+
+        for trial in range(max_number_of_trials):
+            actions = self.agent.act()
+
+            _ , rewards, done, _ = self.env.step(actions)
+            self.agent.feedback(actions, rewards)
+            cumulative_reward += rewards
+            cumulative_regret += self.env.compute_gap(actions)
+
+            mean_regret = cumulative_regret.mean()
+            half_width = z * cumulative_regret.std() / np.sqrt(num_runs)
+            stats.cumulative_rewards[trial] = cumulative_reward.mean()
+            stats.regrets[trial] = mean_regret
+            stats.regrets_lower[trial] = mean_regret - half_width
+            stats.regrets_upper[trial] = mean_regret + half_width
+
+        if self.display is not None:
+            print("--------------------------------------------------", flush = True)
+            print("Policy:", self.agent.name, "\nAverage Reward:", stats.cumulative_rewards[-1] / max_number_of_trials, \
+                    "\nAverage Regret:", stats.regrets[-1] / max_number_of_trials, \
+                    "+/-", (stats.regrets_upper[-1] - stats.regrets[-1]) / max_number_of_trials, flush = True)
+
+            self.display.plot_regret_band(stats)
+        return stats
+
+    def add_step_hook(self, hook):
+        """
+        Call hook(state, action, reward, next_state, done) after every step of run().
+        """
+        self.step_hooks.append(hook)
+        return hook
+    
+    def add_episode_hook(self, hook):
+        """
+        Call hook(episode_number, length, reward) after every episode of run().
+        """
+        self.episode_hooks.append(hook)
+        return hook
+    
+    def run(self, max_number_of_episodes=100, protocol=None, interactive = False, display_frequency=1):
+        """
+        The training loop of all episodic agents.
+
+        The agent protocol (default: the agent's protocol attribute, else ACT_ONLY) decides
+        when the agent is called:
+            ACT_ONLY: act(state) before every step.
+            OFF_POLICY: act(state) before every step, then
+                learn(state, action, reward, next_state, done), e.g. Q-Learning.
+            ON_POLICY: act(next_state) after every step, then
+                learn(state, action, reward, next_state, next_action), e.g. SARSA.
+
+        Registered step and episode hooks, and the live display of interactive runs, are
+        called after every step and episode. Without any of them the loop only checks an
+        empty list per step.
+
+        Returns:
+            EpisodeStats of all recorded episodes.
+        """
+        self._check_interactive(interactive)
+        protocol = protocol or getattr(self.agent, 'protocol', ACT_ONLY)
+        if protocol not in PROTOCOLS:
+            raise ValueError("Unknown agent protocol: {}".format(protocol))
+        on_policy = protocol == ON_POLICY
+        off_policy = protocol == OFF_POLICY
+
+        step_hooks = list(self.step_hooks)
+        episode_hooks = list(self.episode_hooks)
+        # if interactive display, show update for each step and episode
+        if interactive:
+            step_hooks.append(lambda *transition: self.update_display_step())
+            episode_hooks.append(lambda *episode: self.update_display_episode())
+
+        # bind the hot loop's lookups once
+        env_step, act = self.env.step, self.agent.act
+        learn = self.agent.learn if protocol != ACT_ONLY else None
+        record = self.stats.append
 
         # repeat for each episode
         for episode_number in range(max_number_of_episodes):
             
-            # initialize state
+            # initialize state and choose its action
             state = self.env.reset()
+            action = act(state)
             
-            done = False # used to indicate terminal state
             R = 0 # used to display accumulated rewards for an episode
             t = 0 # used to display accumulated steps for an episode i.e episode length
             
             # repeat for each step of episode, until state is terminal
-            while not done:
+            while True:
                 
                 t += 1 # increase step counter - for display
                 
-                # choose action from state using policy derived from Q
-                action = self.agent.act(state)
-                
                 # take action, observe reward and next state
-                next_state, reward, done, _ = self.env.step(action)
-                
-                # agent learn (Q-Learning update)
-                self.agent.learn(state, action, reward, next_state, done)
-                
-                # state <- next state
-                state = next_state
-                
+                next_state, reward, done, _ = env_step(action)
                 R += reward # accumulate reward - for display
                 
-                # if interactive display, show update for each step
-                if interactive:
-                    self.update_display_step()
-            
-            self.episode_length = np.append(self.episode_length,t) # keep episode length - for display
-            self.episode_reward = np.append(self.episode_reward,R) # keep episode reward - for display 
-            
-            # if interactive display, show update for the episode
-            if interactive:
-                self.update_display_episode()
-        
-        # if not interactive display, show graph at the end
-        if not interactive:
-            self.fig.clf()
-            stats = plotting.EpisodeStats(
-                episode_lengths=self.episode_length,
-                episode_rewards=self.episode_reward,
-                episode_running_variance=np.zeros(max_number_of_episodes))
-            plotting.plot_episode_stats(stats, display_frequency)
-            
-    def run_sarsa(self, max_number_of_episodes=100, interactive = False, display_frequency=1):
-
-        # repeat for each episode
-        for episode_number in range(max_number_of_episodes):
-            
-            # initialize state
-            state = self.env.reset()
-
-            done = False # used to indicate terminal state
-            R = 0 # used to display accumulated rewards for an episode
-            t = 0 # used to display accumulated steps for an episode i.e episode length
-            
-            # choose action from state using policy derived from Q
-            action = self.agent.act(state)
-            
-            # repeat for each step of episode, until state is terminal
-            while not done:
-                
-                t += 1 # increase step counter - for display
-                
-                # take action, observe reward and next state
-                next_state, reward, done, _ = self.env.step(action)
+                if on_policy:
+                    # choose next action from next state using policy derived from Q, then learn (SARSA update)
+                    next_action = act(next_state)
+                    learn(state, action, reward, next_state, next_action)
+                elif off_policy:
+                    # agent learn (Q-Learning update)
+                    learn(state, action, reward, next_state, done)
                 
-                # choose next action from next state using policy derived from Q
-                next_action = self.agent.act(next_state)
+                if step_hooks:
+                    for hook in step_hooks:
+                        hook(state, action, reward, next_state, done)
                 
-                # agent learn (SARSA update)
-                self.agent.learn(state, action, reward, next_state, next_action)
+                if done:
+                    break
+                if not on_policy:
+                    next_action = act(next_state)
                 
                 # state <- next state, action <- next_action
                 state = next_state
                 action = next_action
-
-                R += reward # accumulate reward - for display
-                
-                # if interactive display, show update for each step
-                if interactive:
-                    self.update_display_step()
             
-            self.episode_length = np.append(self.episode_length,t) # keep episode length - for display
-            self.episode_reward = np.append(self.episode_reward,R) # keep episode reward - for display 
-            
-            # if interactive display, show update for the episode
-            if interactive:
-                self.update_display_episode()
+            record(t, R) # keep episode length and reward - for display
+            if episode_hooks:
+                for hook in episode_hooks:
+                    hook(episode_number, t, R)
         
+        # the last episodes may have been dropped by the rate limit
+        if interactive:
+            self.update_display_episode(force=True)
+
+        stats = EpisodeStats(
+            episode_lengths=self.episode_length,
+            episode_rewards=self.episode_reward,
+            episode_running_variance=self.stats.episode_running_variance)
         # if not interactive display, show graph at the end
-        if not interactive:
-            self.fig.clf()
-            stats = plotting.EpisodeStats(
-                episode_lengths=self.episode_length,
-                episode_rewards=self.episode_reward,
-                episode_running_variance=np.zeros(max_number_of_episodes))
-            plotting.plot_episode_stats(stats, display_frequency)
\ No newline at end of file
+        if not interactive and self.display is not None:
+            self.display.clear()
+            self.display.plot_episode_stats(stats, display_frequency)
+        return stats
+
+    def run_agent(self, max_number_of_episodes=100, interactive = False, display_frequency=1):
+        return self.run(max_number_of_episodes, ACT_ONLY, interactive, display_frequency)
+
+    def run_qlearning(self, max_number_of_episodes=100, interactive = False, display_frequency=1):
+        return self.run(max_number_of_episodes, OFF_POLICY, interactive, display_frequency)
+
+    def run_sarsa(self, max_number_of_episodes=100, interactive = False, display_frequency=1):
+        return self.run(max_number_of_episodes, ON_POLICY, interactive, display_frequency)
@@ -0,0 +1,107 @@
+import numpy as np
+from collections import namedtuple
+
+EpisodeStats = namedtuple("Stats",["episode_lengths", "episode_rewards", "episode_running_variance"])
+EpisodeStats.__new__.__defaults__ = (None,)
+TimestepStats = namedtuple("Stats",["cumulative_rewards", "regrets"])
+BatchTimestepStats = namedtuple("Stats",["cumulative_rewards", "regrets", "regrets_lower", "regrets_upper"])
+
+
+class EpisodeStatsCollector(object):
+    """
+    Streaming statistics of the episode lengths and rewards of a run.
+
+    The per-episode history is kept in preallocated arrays that double their capacity
+    when full, so recording an episode is amortized O(1). With max_history set, the
+    history becomes a ring buffer of the last max_history episodes and memory stays
+    constant however long the run is. The running mean and variance of the rewards and
+    lengths over all episodes are updated online with Welford's algorithm.
+    """
+
+    def __init__(self, capacity=1024, max_history=None):
+        if max_history is not None:
+            capacity = max_history
+        self.max_history = max_history
+        self._lengths = np.zeros(capacity, dtype=np.int64)
+        self._rewards = np.zeros(capacity)
+        self._running_variance = np.zeros(capacity)
+        self.num_episodes = 0
+        self.mean_reward = 0.
+        self.mean_length = 0.
+        self._m2_reward = 0.
+        self._m2_length = 0.
+
+    def __len__(self):
+        return min(self.num_episodes, len(self._rewards)) if self.max_history else self.num_episodes
+
+    def append(self, length, reward):
+        """
+        Record the length and the total reward of a finished episode.
+        """
+        n = self.num_episodes
+        if self.max_history:
+            i = n % self.max_history
+        else:
+            i = n
+            if i == len(self._rewards):
+                self._grow(2 * len(self._rewards))
+        self.num_episodes = n + 1
+
+        # Welford's online update of the means and the sums of squared deviations
+        delta = reward - self.mean_reward
+        self.mean_reward += delta / (n + 1)
+        self._m2_reward += delta * (reward - self.mean_reward)
+        delta = length - self.mean_length
+        self.mean_length += delta / (n + 1)
+        self._m2_length += delta * (length - self.mean_length)
+
+        self._lengths[i] = length
+        self._rewards[i] = reward
+        self._running_variance[i] = self.reward_variance
+
+    @property
+    def reward_variance(self):
+        return self._m2_reward / self.num_episodes if self.num_episodes else 0.
+
+    @property
+    def length_variance(self):
+        return self._m2_length / self.num_episodes if self.num_episodes else 0.
+
+    def _history(self, values):
+        if not self.max_history:
+            return values[:self.num_episodes]
+        if self.num_episodes <= self.max_history:
+            return values[:self.num_episodes]
+        # Oldest episode first
+        return np.roll(values, -(self.num_episodes % self.max_history))
+
+    @property
+    def episode_lengths(self):
+        return self._history(self._lengths)
+
+    @property
+    def episode_rewards(self):
+        return self._history(self._rewards)
+
+    @property
+    def episode_running_variance(self):
+        """
+        Variance of the rewards of all episodes so far, after every recorded episode.
+        """
+        return self._history(self._running_variance)
+
+    def window_mean(self, window):
+        """
+        A tuple (mean length, mean reward) over the last window recorded episodes.
+        """
+        window = min(window, len(self))
+        if window == 0:
+            return 0., 0.
+        return self.episode_lengths[-window:].mean(), self.episode_rewards[-window:].mean()
+
+    def _grow(self, capacity):
+        for name in ('_lengths', '_rewards', '_running_variance'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
@@ -0,0 +1,174 @@
+import numpy as np
+
+# Episodes up to this many steps are averaged into a table with a plain Python loop
+SCALAR_UPDATE_MAX_STEPS = 32
+
+
+class StateIndexer(object):
+    """
+    Maps the observations of a discrete observation space to flat indices 0..nS-1.
+
+    spaces.Discrete observations are their own index. spaces.Tuple observations of
+    Discrete components, like Blackjack's (player sum, dealer showing, usable ace),
+    are raveled in row-major order.
+    """
+
+    def __init__(self, observation_space):
+        spaces = getattr(observation_space, 'spaces', None)
+        self.dims = (observation_space.n,) if spaces is None else tuple(space.n for space in spaces)
+        self.is_tuple = spaces is not None
+        self.nS = int(np.prod(self.dims))
+        self._strides = [int(np.prod(self.dims[i + 1:])) for i in range(len(self.dims))]
+        self._strides_array = np.array(self._strides, dtype=np.int64)
+
+    def index(self, state):
+        if not self.is_tuple:
+            return int(state)
+        return sum(int(s) * stride for s, stride in zip(state, self._strides))
+
+    def index_many(self, states):
+        """
+        Indices of an array of observations, [N] for Discrete and [N x k] for Tuple spaces.
+        """
+        states = np.asarray(states, dtype=np.int64)
+        if not self.is_tuple:
+            return states
+        return states.dot(self._strides_array)
+
+    def state(self, index):
+        if not self.is_tuple:
+            return int(index)
+        return tuple(int(i) for i in np.unravel_index(index, self.dims))
+
+
+class ValueTable(object):
+    """
+    State-value (nA=None) or action-value table stored as one contiguous array.
+
+    values has shape [S] or [S x A], indexed through a StateIndexer. Q[state] returns the
+    row of state as a view, so legacy code written for a defaultdict of arrays, e.g.
+    Q[state][action] += alpha * (G - Q[state][action]), keeps working. As with a
+    defaultdict, a state shows up in keys()/items() once it has been accessed.
+    """
+
+    def __init__(self, indexer, nA=None):
+        self.indexer = indexer
+        self.nA = nA
+        self.values = np.zeros(indexer.nS if nA is None else (indexer.nS, nA))
+        self.visited = np.zeros(indexer.nS, dtype=bool)
+
+    def __getitem__(self, state):
+        i = self.indexer.index(state)
+        self.visited[i] = True
+        return self.values[i]
+
+    def __setitem__(self, state, value):
+        i = self.indexer.index(state)
+        self.visited[i] = True
+        self.values[i] = value
+
+    def __contains__(self, state):
+        return bool(self.visited[self.indexer.index(state)])
+
+    def __len__(self):
+        return int(np.count_nonzero(self.visited))
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def get(self, state, default=None):
+        i = self.indexer.index(state)
+        return self.values[i] if self.visited[i] else default
+
+    def keys(self):
+        return [self.indexer.state(i) for i in np.flatnonzero(self.visited)]
+
+    def items(self):
+        return [(self.indexer.state(i), self.values[i]) for i in np.flatnonzero(self.visited)]
+
+    def lookup(self, states):
+        """
+        Values of an array of observations in one operation, without marking them visited.
+        """
+        return self.values[self.indexer.index_many(states)]
+
+    def greedy_actions(self):
+        """
+        Greedy action of every state index, ties broken towards the first action.
+        """
+        return np.argmax(self.values, axis=1)
+
+    def state_values(self):
+        """
+        ValueTable of max_a Q(s, a) over the same states.
+        """
+        V = ValueTable(self.indexer)
+        V.values = np.max(self.values, axis=1)
+        V.visited = self.visited.copy()
+        return V
+
+
+class FirstVisitAverager(object):
+    """
+    Incremental first-visit Monte Carlo averages of a ValueTable, of the state values
+    V(s) or, for a table with actions, of the action values Q(s, a).
+
+    update(episode) averages the return following the first visit of every state or
+    state-action pair of an episode into the table. Episodes of up to
+    SCALAR_UPDATE_MAX_STEPS steps, like Blackjack's one or two, are walked in plain
+    Python, which costs a few microseconds where the array operations of longer
+    episodes cost tens. Both paths give the same values.
+    """
+
+    def __init__(self, table, discount_factor=1.0):
+        self.table = table
+        self.discount_factor = discount_factor
+        # Flat view of the table, indexed by state_index or state_index * nA + action
+        self.values = table.values.reshape(-1)
+        self.counts = np.zeros(len(self.values))
+
+    def update(self, episode):
+        """
+        Average the first-visit returns of a single episode into the table.
+
+        Args:
+            episode: lib.episode.EpisodeBuffer holding one episode.
+
+        Returns:
+            The indices of the states visited by the episode, e.g. to refresh a policy.
+        """
+        if len(episode) <= SCALAR_UPDATE_MAX_STEPS:
+            return self._update_scalar(episode)
+        indexer, nA = self.table.indexer, self.table.nA
+        states = indexer.index_many(episode.states)
+        keys = states if nA is None else states * nA + episode.actions
+        # Return following every time step, accumulated in a single backward pass
+        G = episode.returns(self.discount_factor)
+        # Only the first visit of a key in this episode counts
+        _, first_visits = np.unique(keys, return_index=True)
+        visited = keys[first_visits]
+        self.counts[visited] += 1
+        self.values[visited] += (G[first_visits] - self.values[visited]) / self.counts[visited]
+        states = np.unique(states)
+        self.table.visited[states] = True
+        return states
+
+    def _update_scalar(self, episode):
+        index, nA = self.table.indexer.index, self.table.nA
+        states, actions, rewards = episode.states.tolist(), episode.actions.tolist(), episode.rewards.tolist()
+        # Walking backwards, the last return stored for a key is the one of its first visit
+        first_returns = {}
+        g = 0.
+        for t in range(len(rewards) - 1, -1, -1):
+            g = rewards[t] + self.discount_factor * g
+            s = index(states[t])
+            first_returns[s if nA is None else s * nA + actions[t]] = g
+
+        values, counts, visited = self.values, self.counts, self.table.visited
+        for key, g in first_returns.items():
+            counts[key] += 1
+            values[key] += (g - values[key]) / counts[key]
+        states = set(first_returns) if nA is None else {key // nA for key in first_returns}
+        for s in states:
+            visited[s] = True
+        return sorted(states)
@@ -1,18 +1,64 @@
 import numpy as np
 
-def randargmax(x):
+# 1-D inputs up to this length take the pure Python path of randargmax
+SCALAR_ARGMAX_MAX_ACTIONS = 16
+
+
+def randargmax(x, np_random=np.random):
     """Argmax operator that breaks ties uniformly at random.
 
+    Small inputs, like the action values of a single state, are scanned in pure Python,
+    which avoids the overhead of several NumPy calls per step in hot loops. NaNs are
+    ignored like np.nanargmax does, an input of NaNs only returns 0 like np.argmax.
+
     Args:
         x (ndarray): Input array with ndim=1.
+        np_random (RandomState or Generator): Source of randomness, only used on ties.
 
     Returns:
         int: Index at which x is maximum. If there are multiple maxima, then one of the indices is chosen uniformly at random.
 
     """
-    mxs = np.amax(x)
-    idxs = np.where(x == mxs)[0]
-    if len(idxs) > 1:
-        return np.random.choice(idxs)
+    if len(x) <= SCALAR_ARGMAX_MAX_ACTIONS:
+        values = x.tolist() if isinstance(x, np.ndarray) else list(x)
+        mx = max(values)
+        idxs = [i for i, v in enumerate(values) if v == mx]
+        if not idxs:
+            # max() returned a NaN, only NaN compares unequal to itself
+            valid = [v for v in values if v == v]
+            mx = max(valid) if valid else None
+            idxs = [i for i, v in enumerate(values) if v == mx] or [0]
     else:
-        return np.argmax(x)
+        # fmax skips NaNs, it only returns NaN if all entries are NaN
+        idxs = np.flatnonzero(x == np.fmax.reduce(x))
+        if len(idxs) == 0:
+            idxs = [0]
+    if len(idxs) > 1:
+        return int(idxs[int(np_random.random() * len(idxs))])
+    return int(idxs[0])
+
+
+def randargmax_rows(x, np_random=np.random, prefer=None):
+    """Row-wise argmax operator that breaks ties uniformly at random.
+
+    Every maximum of a row gets a uniform random key and the largest key wins, so all
+    rows are handled by one masked uniform draw. NaNs are ignored, a row of NaNs only
+    picks column 0.
+
+    Args:
+        x (ndarray): Input array with ndim=2.
+        np_random (RandomState or Generator): Source of randomness.
+        prefer (ndarray): Optional column for each row that is kept whenever it is one of
+            the maxima of its row, e.g. the current actions of a policy being improved, so
+            ties cannot make the policy oscillate.
+
+    Returns:
+        ndarray: Vector with, for each row of x, the column of a maximum chosen uniformly at random among the maxima.
+
+    """
+    is_max = x == np.fmax.reduce(x, axis=1, keepdims=True)
+    # Random keys for the maxima only, the largest key picks one maximum uniformly
+    choice = np.argmax(np.where(is_max, np_random.random(x.shape), -1.), axis=1)
+    if prefer is not None:
+        choice = np.where(is_max[np.arange(len(x)), prefer], prefer, choice)
+    return choice